@@ -46,6 +46,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'main_app.middleware.QueryBudgetMiddleware',
+    'main_app.replicas.replica_pin_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -68,6 +70,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'main_app.context_processors.attendance_rules',
             ],
         },
     },
@@ -86,9 +89,69 @@ DATABASES = {
         'USER': os.getenv('DATABASEUSER'),
         'PASSWORD': os.getenv('DATABASEPASSWORD'),
         'PORT': os.getenv('DATABASEPORT'),
+        # Keep connections open between requests instead of reconnecting every time; health checks
+        # replace a connection the server dropped before it is reused. Async requests do not reuse
+        # connections, so under ASGI set DATABASECONNMAXAGE=0 and pool connections in front of Postgres
+        'CONN_MAX_AGE': int(os.getenv('DATABASECONNMAXAGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Read-only report pages (see replica_reads in main_app/replicas.py) read from a streaming replica
+# when DATABASEREPLICAHOST is set. A browser that just wrote stays on the primary for
+# REPLICA_PIN_SECONDS so it sees its own changes.
+if os.getenv('DATABASEREPLICAHOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.getenv('DATABASEREPLICAHOST'),
+        'PORT': os.getenv('DATABASEREPLICAPORT', DATABASES['default']['PORT']),
+        # Tests run against the primary only
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['main_app.replicas.ReplicaRouter']
+REPLICA_DATABASE = 'replica'
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICAPINSECONDS', 15))
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Class pages, rosters and membership lists are cached under per-class version counters, and
+# access checks read the cached classes and rosters, so every worker must share one cache: a
+# version bumped by one worker has to reach the others. The default file cache is shared by the
+# workers of one host; with several hosts point CACHEBACKEND/CACHELOCATION at a Redis or Memcached server
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHEBACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('CACHELOCATION', str(BASE_DIR / 'cache')),
+    }
+}
+
+
+# Email
+# Lateness notices are sent by the run_jobs worker; locally they are printed to its console
+
+EMAIL_BACKEND = os.getenv('EMAILBACKEND', 'django.core.mail.backends.console.EmailBackend')
+DEFAULT_FROM_EMAIL = os.getenv('DEFAULTFROMEMAIL', 'noreply@ga-attendance.local')
+
+
+# Query budget
+# In debug or staging (QUERYBUDGET=1) every response carries X-Query-Count and X-Query-Time headers
+# and an INFO line on the main_app.middleware logger with its slowest statements; requests running
+# more than QUERYBUDGETLIMIT queries are logged as warnings
+
+QUERY_BUDGET = DEBUG or os.getenv('QUERYBUDGET') == '1'
+QUERY_BUDGET_LIMIT = int(os.getenv('QUERYBUDGETLIMIT', 20))
+
+
+# Authentication backends
+# https://docs.djangoproject.com/en/5.1/topics/auth/customizing/#specifying-authentication-backends
+
+AUTHENTICATION_BACKENDS = [
+    'main_app.backends.ProfileModelBackend',
+]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -132,4 +195,8 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 MEDIA_URL = '/media/'
-MEDIA_ROOT = BASE_DIR / 'media'
\ No newline at end of file
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Compressed attendance of archived classes (see the archive_attendance command); kept out of
+# MEDIA_ROOT so it is never served, and shared between servers like the database
+ATTENDANCE_ARCHIVE_ROOT = os.getenv('ATTENDANCEARCHIVEDIR', BASE_DIR / 'archive')
\ No newline at end of file
@@ -0,0 +1,160 @@
+from functools import wraps
+from django.contrib import messages
+from django.contrib.auth.views import redirect_to_login
+from django.core.cache import cache
+from django.http import Http404
+from django.shortcuts import redirect
+from .caching import (
+    VERSIONED_CACHE_SECONDS, class_version, aclass_version, class_versions, user_version)
+from .models import Class
+from .replicas import primary_reads
+
+
+# What the class page shows of each enrolled student: the name and the avatar thumbnail
+ROSTER_FIELDS = ('id', 'username', 'profile__profile_img', 'profile__image_variants_ready')
+
+
+def class_cache_key(class_id, version):
+    return f'class:{class_id}:{version}'
+
+
+def roster_cache_key(class_id, version):
+    return f'class-roster:{class_id}:{version}'
+
+
+# Fetches a class (with its teacher) once per request; later calls for the same pk reuse it,
+# and across requests it is served from the cache until the class version changes
+def get_class(request, pk):
+    classes = request.__dict__.setdefault('_classes', {})
+    try:
+        pk = int(pk)
+    except (TypeError, ValueError):
+        raise Http404("No class matches the given query.")
+    if pk not in classes:
+        found = cached_classes([pk])
+        if not found:
+            raise Http404("No class matches the given query.")
+        classes[pk] = found[0]
+    return classes[pk]
+
+
+# Async counterpart of get_class, sharing the same per-request cache
+async def aget_class(request, pk):
+    classes = request.__dict__.setdefault('_classes', {})
+    try:
+        pk = int(pk)
+    except (TypeError, ValueError):
+        raise Http404("No class matches the given query.")
+    if pk not in classes:
+        key = class_cache_key(pk, await aclass_version(pk))
+        class_instance = await cache.aget(key)
+        if class_instance is None:
+            try:
+                with primary_reads():
+                    class_instance = await Class.objects.select_related('teacher').aget(pk=pk)
+            except Class.DoesNotExist:
+                raise Http404("No class matches the given query.")
+            await cache.aset(key, class_instance, VERSIONED_CACHE_SECONDS)
+        classes[pk] = class_instance
+    return classes[pk]
+
+
+# Classes (with their teachers) in the order of class_ids, each cached under its own version;
+# only the ones missing from the cache are fetched, in a single query
+def cached_classes(class_ids):
+    keys = {class_id: class_cache_key(class_id, version) for class_id, version in class_versions(class_ids).items()}
+    found = cache.get_many(keys.values())
+    missing = [class_id for class_id, key in keys.items() if key not in found]
+    if missing:
+        with primary_reads():
+            fetched = Class.objects.select_related('teacher').in_bulk(missing)
+        cache.set_many({keys[class_id]: class_instance for class_id, class_instance in fetched.items()}, VERSIONED_CACHE_SECONDS)
+        found.update({keys[class_id]: class_instance for class_id, class_instance in fetched.items()})
+    return [found[keys[class_id]] for class_id in class_ids if keys[class_id] in found]
+
+
+# Enrolled students of a class, cached until the class version changes
+def class_roster(class_instance):
+    key = roster_cache_key(class_instance.pk, class_version(class_instance.pk))
+    roster = cache.get(key)
+    if roster is None:
+        with primary_reads():
+            roster = list(class_instance.students.select_related('profile').only(*ROSTER_FIELDS))
+        cache.set(key, roster, VERSIONED_CACHE_SECONDS)
+    return roster
+
+
+async def aclass_roster(class_instance):
+    key = roster_cache_key(class_instance.pk, await aclass_version(class_instance.pk))
+    roster = await cache.aget(key)
+    if roster is None:
+        with primary_reads():
+            roster = [
+                student async for student in class_instance.students.select_related('profile').only(*ROSTER_FIELDS)
+            ]
+        await cache.aset(key, roster, VERSIONED_CACHE_SECONDS)
+    return roster
+
+
+# Ids of the classes a user takes part in, cached until their memberships change
+def member_class_ids(user, relation):
+    key = f'{relation}:{user.pk}:{user_version(user.pk)}'
+    class_ids = cache.get(key)
+    if class_ids is None:
+        with primary_reads():
+            class_ids = list(getattr(user, relation).order_by('pk').values_list('pk', flat=True))
+        cache.set(key, class_ids, VERSIONED_CACHE_SECONDS)
+    return class_ids
+
+
+def enrolled_classes(user):
+    return cached_classes(member_class_ids(user, 'enrolled_classes'))
+
+
+def taught_classes(user):
+    return cached_classes(member_class_ids(user, 'taught_classes'))
+
+
+# Ids of the classes a student has asked to join and is still waiting on
+def pending_class_ids(user):
+    key = f'pending-requests:{user.pk}:{user_version(user.pk)}'
+    class_ids = cache.get(key)
+    if class_ids is None:
+        with primary_reads():
+            class_ids = list(user.joinrequest_set.filter(status='Pending').values_list('classid', flat=True))
+        cache.set(key, class_ids, VERSIONED_CACHE_SECONDS)
+    return class_ids
+
+
+# login_required for async views; it also resolves request.user up front, because the lazy
+# request.user would query synchronously when the template touches it inside the event loop
+def async_login_required(view):
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        request.user = await request.auser()
+        if not request.user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+# True when the signed-in user is a teacher and runs this class; uses the preloaded profile
+def is_class_teacher(request, class_instance):
+    return request.user.profile.role == 'Teacher' and class_instance.teacher_id == request.user.id
+
+
+# Lets only the class's own teacher through, exposing the class as request.class_instance
+# url_kwarg names the URL parameter holding the class pk
+def class_teacher_required(url_kwarg='pk', denied_message=None):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            class_instance = get_class(request, kwargs[url_kwarg])
+            if not is_class_teacher(request, class_instance):
+                if denied_message:
+                    messages.error(request, denied_message)
+                return redirect('home')
+            request.class_instance = class_instance
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
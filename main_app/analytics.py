@@ -0,0 +1,182 @@
+from itertools import islice
+import numpy as np
+from django.contrib.auth.models import User
+from django.db.models import Sum
+from .models import Attendance, Class, DailyAttendanceRollup, TALLY_FIELDS
+from .archive import archived_columns
+from . import rules
+
+LOAD_CHUNK_SIZE = 10000
+
+# Column index of each status in the per-group count matrix
+STATUS_COLUMNS = {'P': 0, 'A': 1, 'L': 2, 'E': 3}
+EPOCH = np.datetime64('1970-01-01', 'D')
+# Status column by status byte, -1 for anything that is not a known status
+STATUS_LOOKUP = np.full(256, -1, dtype=np.int8)
+STATUS_LOOKUP[[ord(status) for status in STATUS_COLUMNS]] = list(STATUS_COLUMNS.values())
+
+
+# Loads attendance for some classes and/or a date window into columnar NumPy arrays
+# (student id, class id, day number, status column), streaming the live rows in chunks
+# and adding the marks of archived classes
+def load_attendance(classes=None, since=None, until=None):
+    rows = Attendance.objects.all()
+    if classes is not None:
+        rows = rows.filter(classid__in=classes)
+    if since:
+        rows = rows.filter(date__gte=since)
+    if until:
+        rows = rows.filter(date__lte=until)
+    rows = rows.order_by().values_list('student_id', 'classid_id', 'date', 'status')
+
+    size = rows.count()
+    columns = {
+        'student': np.empty(size, dtype=np.int64),
+        'classid': np.empty(size, dtype=np.int64),
+        'day': np.empty(size, dtype=np.int32),
+        'status': np.empty(size, dtype=np.int8),
+    }
+    iterator = rows.iterator(chunk_size=LOAD_CHUNK_SIZE)
+    filled = 0
+    while filled < size:
+        chunk = list(islice(iterator, min(LOAD_CHUNK_SIZE, size - filled)))
+        if not chunk:
+            break
+        student_ids, class_ids, days, statuses = zip(*chunk)
+        end = filled + len(chunk)
+        columns['student'][filled:end] = np.fromiter(student_ids, dtype=np.int64, count=len(chunk))
+        columns['classid'][filled:end] = np.fromiter(class_ids, dtype=np.int64, count=len(chunk))
+        columns['day'][filled:end] = np.array(days, dtype='datetime64[D]').astype(np.int64)
+        columns['status'][filled:end] = STATUS_LOOKUP[np.array(statuses, dtype='S1').view(np.uint8)]
+        filled = end
+
+    # Archived classes have no live rows; their marks come from the archive files
+    archived = Class.objects.filter(archived_at__isnull=False)
+    if classes is not None:
+        archived = archived.filter(pk__in=classes)
+    parts = [{name: column[:filled] for name, column in columns.items()}]
+    parts += archived_columns(archived.values_list('pk', flat=True), STATUS_COLUMNS, since, until)
+    columns = {name: np.concatenate([part[name] for part in parts]) for name in columns}
+
+    # Rows deleted between the count and the read leave unused slots; unknown statuses are dropped
+    keep = columns['status'] >= 0
+    return {name: column[keep] for name, column in columns.items()}
+
+
+# Counts each status per group with a single bincount
+def status_counts(group, status, groups):
+    counts = np.bincount(group * len(STATUS_COLUMNS) + status, minlength=groups * len(STATUS_COLUMNS))
+    return counts.reshape(groups, len(STATUS_COLUMNS))
+
+
+# Computes per-(student, class) rates, the recent-window trend and the at-risk flag, all vectorized
+def summarize(columns, window=rules.TREND_WINDOW):
+    if not len(columns['student']):
+        return None
+
+    pairs, group = np.unique(
+        np.stack([columns['student'], columns['classid']], axis=1), axis=0, return_inverse=True,
+    )
+    group = group.reshape(-1)
+    status = columns['status'].astype(np.int64)
+
+    counts = status_counts(group, status, len(pairs))
+    present, absent, late, excused = counts.T
+    total = counts.sum(axis=1)
+
+    # Rank each row from the newest session backwards within its group, keep the last `window`
+    order = np.lexsort((columns['day'], group))
+    sorted_group = group[order]
+    group_end = np.searchsorted(sorted_group, sorted_group, side='right')
+    recent = (group_end - np.arange(len(order)) - 1) < window
+    recent_counts = status_counts(sorted_group[recent], status[order][recent], len(pairs))
+
+    absence_pct = rules.absence_percentage(absent, late, total)
+    recent_pct = rules.absence_percentage(
+        recent_counts[:, STATUS_COLUMNS['A']], recent_counts[:, STATUS_COLUMNS['L']], recent_counts.sum(axis=1)
+    )
+
+    return {
+        'student': pairs[:, 0],
+        'classid': pairs[:, 1],
+        'present': present,
+        'absent': absent,
+        'late': late,
+        'excused': excused,
+        'total': total,
+        'adjusted_absences': rules.lateness_adjusted_absences(absent, late),
+        'absence_pct': absence_pct,
+        'attendance_rate': rules.attendance_rate(absent, late, total),
+        'recent_absence_pct': recent_pct,
+        'trend': recent_pct - absence_pct,
+        'at_risk': (
+            rules.is_absence_warning(absence_pct)
+            | rules.is_absence_warning(recent_pct)
+            | rules.is_late_warning(late)
+        ),
+    }
+
+
+# Class-wide attendance rate per session day from the nightly daily rollups
+def rollup_trend(classes, since=None, until=None, window=rules.TREND_WINDOW):
+    rows = DailyAttendanceRollup.objects.filter(classid__in=classes)
+    if since:
+        rows = rows.filter(date__gte=since)
+    if until:
+        rows = rows.filter(date__lte=until)
+    rows = list(
+        rows.values_list('date')
+        .annotate(*(Sum(field) for field in TALLY_FIELDS.values()))
+        .order_by('date')
+    )
+    if not rows:
+        return []
+    dates = [row[0] for row in rows]
+    counts = np.array([row[1:] for row in rows], dtype=np.int64)
+    return trend_rows(dates, counts, window)
+
+
+# Turns per-day status counts into rate rows with a rolling mean over the last `window` sessions
+def trend_rows(dates, counts, window):
+    rate = rules.attendance_rate(counts[:, STATUS_COLUMNS['A']], counts[:, STATUS_COLUMNS['L']], counts.sum(axis=1))
+
+    cumulative = np.cumsum(np.insert(rate, 0, 0))
+    span = np.minimum(np.arange(1, len(dates) + 1), window)
+    rolling = (cumulative[1:] - cumulative[np.arange(1, len(dates) + 1) - span]) / span
+
+    return [
+        {'date': day, 'rate': round(float(r), 2), 'rolling_rate': round(float(avg), 2)}
+        for day, r, avg in zip(dates, rate, rolling)
+    ]
+
+
+# Every student's metrics for a class or term as row dicts, at-risk students first
+def student_report(classes=None, since=None, until=None):
+    columns = load_attendance(classes, since, until)
+    summary = summarize(columns)
+    if summary is None:
+        return []
+
+    order = np.lexsort((-summary['absence_pct'], ~summary['at_risk']))
+    users = User.objects.in_bulk(set(summary['student'].tolist()))
+    class_names = dict(Class.objects.filter(pk__in=set(summary['classid'].tolist())).values_list('pk', 'name'))
+
+    report = []
+    for i in order.tolist():
+        student_id, class_id = int(summary['student'][i]), int(summary['classid'][i])
+        report.append({
+            'student': users.get(student_id),
+            'class_id': class_id,
+            'class_name': class_names.get(class_id, ''),
+            'present': int(summary['present'][i]),
+            'absent': int(summary['absent'][i]),
+            'late': int(summary['late'][i]),
+            'excused': int(summary['excused'][i]),
+            'total': int(summary['total'][i]),
+            'absence_pct': round(float(summary['absence_pct'][i]), 2),
+            'attendance_rate': round(float(summary['attendance_rate'][i]), 2),
+            'recent_absence_pct': round(float(summary['recent_absence_pct'][i]), 2),
+            'trend': round(float(summary['trend'][i]), 2),
+            'at_risk': bool(summary['at_risk'][i]),
+        })
+    return report
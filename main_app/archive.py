@@ -0,0 +1,139 @@
+import io
+from datetime import date
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils.functional import LazyObject, empty
+from .models import Attendance, Class
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+# Columns of an archive file; each is one NumPy array, row i of every column is one attendance mark
+ARCHIVE_COLUMNS = ('id', 'student', 'day', 'status', 'reason')
+
+
+# Archive files live outside MEDIA_ROOT so they are never served
+class ArchiveStorage(LazyObject):
+    def _setup(self):
+        self._wrapped = FileSystemStorage(location=settings.ATTENDANCE_ARCHIVE_ROOT)
+
+
+archive_storage = ArchiveStorage()
+
+
+# Lets tests point ATTENDANCE_ARCHIVE_ROOT at a temporary directory
+@receiver(setting_changed)
+def reset_archive_storage(setting, **kwargs):
+    if setting == 'ATTENDANCE_ARCHIVE_ROOT':
+        archive_storage._wrapped = empty
+
+
+def archive_name(class_id):
+    return f'attendance/class-{class_id}.npz'
+
+
+# Packs attendance rows (id, student id, date, status, reason) into compressed column arrays,
+# ordered by date then id like the live table's history pages
+def pack(rows):
+    rows = sorted(rows, key=lambda row: (row[2], row[0]))
+    columns = {
+        'id': np.array([row[0] for row in rows], dtype=np.int64),
+        'student': np.array([row[1] for row in rows], dtype=np.int64),
+        'day': np.array([row[2].toordinal() - EPOCH_ORDINAL for row in rows], dtype=np.int32),
+        'status': np.array([row[3] for row in rows], dtype='S1'),
+        'reason': np.array([row[4] or '' for row in rows], dtype=str),
+    }
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **columns)
+    return buffer.getvalue()
+
+
+# Writes a class's archive file, replacing any earlier one, and returns its name
+def write_archive(class_id, rows):
+    name = archive_name(class_id)
+    archive_storage.delete(name)
+    return archive_storage.save(name, ContentFile(pack(rows)))
+
+
+def read_archive(class_id):
+    with archive_storage.open(archive_name(class_id)) as archive_file:
+        with np.load(archive_file) as archive:
+            return {column: archive[column] for column in ARCHIVE_COLUMNS}
+
+
+def delete_archive(class_id):
+    archive_storage.delete(archive_name(class_id))
+
+
+# Archived marks as unsaved Attendance instances, oldest first, optionally for one student and a
+# date window or status; the class is attached, students are not (see with_students)
+def archived_records(class_instance, student_id=None, since=None, until=None, status=None):
+    columns = read_archive(class_instance.pk)
+    keep = np.ones(len(columns['id']), dtype=bool)
+    if student_id is not None:
+        keep &= columns['student'] == student_id
+    if since:
+        keep &= columns['day'] >= since.toordinal() - EPOCH_ORDINAL
+    if until:
+        keep &= columns['day'] <= until.toordinal() - EPOCH_ORDINAL
+    if status:
+        keep &= columns['status'] == status.encode()
+
+    records = []
+    for pk, student, day, mark, reason in zip(*(columns[column][keep].tolist() for column in ARCHIVE_COLUMNS)):
+        record = Attendance(
+            pk=pk, student_id=student, classid_id=class_instance.pk,
+            date=date.fromordinal(day + EPOCH_ORDINAL), status=mark.decode(), reason=reason or None,
+        )
+        record.classid = class_instance
+        records.append(record)
+    return records
+
+
+# Attaches each record's student with a single query; the marks of deleted accounts are dropped,
+# as the live table's cascade drops them
+def with_students(records):
+    students = User.objects.in_bulk({record.student_id for record in records})
+    kept = []
+    for record in records:
+        if record.student_id in students:
+            record.student = students[record.student_id]
+            kept.append(record)
+    return kept
+
+
+# The archived marks of some classes within a date window, in the analytics layout: one array each
+# of student id, class id, day number and status column (as mapped by status_columns)
+def archived_columns(class_ids, status_columns, since=None, until=None):
+    codes = np.full(256, -1, dtype=np.int8)
+    for status, column in status_columns.items():
+        codes[ord(status)] = column
+
+    parts = []
+    for class_id in class_ids:
+        columns = read_archive(class_id)
+        keep = np.ones(len(columns['id']), dtype=bool)
+        if since:
+            keep &= columns['day'] >= since.toordinal() - EPOCH_ORDINAL
+        if until:
+            keep &= columns['day'] <= until.toordinal() - EPOCH_ORDINAL
+        parts.append({
+            'student': columns['student'][keep],
+            'classid': np.full(keep.sum(), class_id, dtype=np.int64),
+            'day': columns['day'][keep],
+            'status': codes[columns['status'][keep].view(np.uint8)],
+        })
+    return parts
+
+
+# A deleted class takes its archive file with it
+@receiver(post_delete, sender=Class)
+def remove_class_archive(sender, instance, **kwargs):
+    if instance.archived_at:
+        class_id = instance.pk
+        transaction.on_commit(lambda: delete_archive(class_id))
@@ -0,0 +1,184 @@
+from collections import Counter, defaultdict
+from functools import wraps
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from .caching import bump_class_version
+from .jobs import enqueue
+from .models import Attendance, AttendanceTally, Profile, TALLY_FIELDS
+from .rules import (
+    LATE_WARNING_COUNT, LATE_REMOVAL_COUNT, is_late_warning, is_absence_warning, lateness_adjusted_absences)
+
+# Times a mark write runs before a conflict on (student, class, date) is raised
+WRITE_ATTEMPTS = 2
+
+
+# Reruns a write whose insert collided with a concurrent first mark for the same (student, class, date):
+# the rerun reads the row the other transaction committed and updates it, so the tallies stay exact
+def retry_on_conflict(write):
+    @wraps(write)
+    def wrapper(*args, **kwargs):
+        for attempt in range(1, WRITE_ATTEMPTS + 1):
+            try:
+                with transaction.atomic():
+                    return write(*args, **kwargs)
+            except IntegrityError:
+                if attempt == WRITE_ATTEMPTS:
+                    raise
+    return wrapper
+
+
+# Saves a whole roll call in one transaction, keyed on (student, class, date)
+# Rows already marked for the date are updated instead of duplicated; the lateness rules
+# for the students newly marked late run afterwards on the job queue. Returns those students
+# who now stand at the warning count and at the removal count, read from the tallies
+@retry_on_conflict
+def commit_roll_call(class_instance, entries, day):
+    entries = {student.pk: (student, status, reason) for student, status, reason in entries}
+
+    with transaction.atomic():
+        existing = {}
+        for att in Attendance.objects.select_for_update().filter(
+            classid=class_instance, date=day, student_id__in=entries
+        ):
+            existing.setdefault(att.student_id, att)
+
+        now = timezone.now()
+        to_create, to_update, changes = [], [], []
+        for student_id, (student, status, reason) in entries.items():
+            att = existing.get(student_id)
+            if att is None:
+                to_create.append(Attendance(
+                    student=student, classid=class_instance, date=day, status=status, reason=reason
+                ))
+                changes.append((student_id, None, status))
+            elif att.status != status or att.reason != reason:
+                changes.append((student_id, att.status, status))
+                att.status = status
+                att.reason = reason
+                # bulk_update skips auto_now, and the rollups find changed days by this column
+                att.updated_at = now
+                to_update.append(att)
+
+        Attendance.objects.bulk_create(to_create)
+        Attendance.objects.bulk_update(to_update, ['status', 'reason', 'updated_at'])
+        apply_tally_changes(class_instance, changes)
+        if changes:
+            refresh_standing([student_id for student_id, _, _ in changes])
+            bump_class_version(class_instance.pk)
+
+        late_students = [entries[student_id][0] for student_id, old_status, status in changes
+                         if status == 'L' and old_status != 'L']
+        if not late_students:
+            return [], []
+        enqueue('attendance_rules', class_id=class_instance.pk, student_ids=[student.pk for student in late_students])
+        return lateness_outcomes(class_instance, late_students)
+
+
+# Creates or updates a single student's mark for a date and keeps the tally in step
+# A change to late queues the lateness rules for the student, as a roll call does
+@retry_on_conflict
+def save_attendance(class_instance, student, day, status, reason=''):
+    with transaction.atomic():
+        attendance = Attendance.objects.select_for_update().filter(
+            classid=class_instance, student=student, date=day
+        ).first()
+        if attendance is None:
+            attendance = Attendance.objects.create(
+                classid=class_instance, student=student, date=day, status=status, reason=reason
+            )
+            old_status = None
+        else:
+            old_status = attendance.status
+            attendance.status = status
+            attendance.reason = reason
+            attendance.save(update_fields=['status', 'reason', 'updated_at'])
+        apply_tally_changes(class_instance, [(student.pk, old_status, status)])
+        refresh_standing([student.pk])
+        bump_class_version(class_instance.pk)
+        if status == 'L' and old_status != 'L':
+            enqueue('attendance_rules', class_id=class_instance.pk, student_ids=[student.pk])
+    return attendance
+
+
+# Applies status transitions to the class tallies; changes are (student_id, old_status, new_status)
+# Must run inside the transaction that wrote the Attendance rows
+def apply_tally_changes(class_instance, changes):
+    deltas = defaultdict(Counter)
+    for student_id, old_status, new_status in changes:
+        if old_status == new_status:
+            continue
+        if old_status:
+            deltas[student_id][TALLY_FIELDS[old_status]] -= 1
+        if new_status:
+            deltas[student_id][TALLY_FIELDS[new_status]] += 1
+    if not deltas:
+        return
+
+    AttendanceTally.objects.bulk_create(
+        [AttendanceTally(student_id=student_id, classid=class_instance) for student_id in deltas],
+        ignore_conflicts=True,
+    )
+    tallies = list(
+        AttendanceTally.objects.select_for_update().filter(classid=class_instance, student_id__in=deltas)
+    )
+    for tally in tallies:
+        for field, delta in deltas[tally.student_id].items():
+            setattr(tally, field, getattr(tally, field) + delta)
+    AttendanceTally.objects.bulk_update(tallies, list(TALLY_FIELDS.values()))
+
+
+# Splits students into those whose late tally is at the warning count and those at or past the
+# removal count, with a single tally lookup
+def lateness_outcomes(class_instance, students):
+    late_counts = dict(
+        AttendanceTally.objects.filter(classid=class_instance, student__in=students)
+        .values_list('student', 'late')
+    )
+
+    warned, removed = [], []
+    for student in students:
+        late_count = late_counts.get(student.pk, 0)
+        if late_count == LATE_WARNING_COUNT:
+            warned.append(student)
+        elif late_count >= LATE_REMOVAL_COUNT:
+            removed.append(student)
+    return warned, removed
+
+
+# Applies the lateness rules to a batch of students
+# Returns the students who got a warning and the students who were removed
+def process_attendance_rules(class_instance, students):
+    if not students:
+        return [], []
+
+    warned, removed = lateness_outcomes(class_instance, students)
+
+    if removed:
+        class_instance.students.remove(*removed)
+        Profile.objects.filter(user__in=removed).update(
+            removal_notice=f"You were removed from {class_instance.name} due to repeated lateness."[:255]
+        )
+    return warned, removed
+
+
+# Recomputes the nav's standing flags for some students from all of their tallies
+def refresh_standing(student_ids):
+    flags = {student_id: [False, 0, 0] for student_id in student_ids}
+    for student_id, present, absent, late, excused in AttendanceTally.objects.filter(
+        student_id__in=flags
+    ).values_list('student', *TALLY_FIELDS.values()):
+        standing = flags[student_id]
+        standing[0] |= is_late_warning(late)
+        standing[1] += lateness_adjusted_absences(absent, late)
+        standing[2] += present + absent + late + excused
+
+    profiles = list(Profile.objects.filter(user_id__in=flags).only('user_id', 'late_warning', 'absence_warning'))
+    changed = []
+    for profile in profiles:
+        late_warning, adjusted, total = flags[profile.user_id]
+        absence_warning = bool(total) and is_absence_warning(adjusted * 100 / total)
+        if (profile.late_warning, profile.absence_warning) != (late_warning, absence_warning):
+            profile.late_warning = late_warning
+            profile.absence_warning = absence_warning
+            changed.append(profile)
+    Profile.objects.bulk_update(changed, ['late_warning', 'absence_warning'])
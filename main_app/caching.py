@@ -0,0 +1,91 @@
+import time
+from django.core.cache import cache
+from django.db import transaction
+
+CLASS_VERSION_TIMEOUT = None
+# How long versioned entries are kept; a version bump makes them unreachable long before that
+VERSIONED_CACHE_SECONDS = 60 * 60 * 24
+
+# Bumped whenever any class is created, renamed or deleted, for pages listing classes across teachers
+CATALOG_VERSION_KEY = 'class-catalog-version'
+
+
+def class_version_key(class_id):
+    return f'class-version:{class_id}'
+
+
+def user_version_key(user_id):
+    return f'user-version:{user_id}'
+
+
+# A fresh starting version; time-based so a version evicted from the cache never repeats an old one
+def initial_version():
+    return int(time.time() * 1000)
+
+
+def current_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, initial_version(), CLASS_VERSION_TIMEOUT)
+        version = cache.get(key)
+    return version
+
+
+async def acurrent_version(key):
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, initial_version(), CLASS_VERSION_TIMEOUT)
+        version = await cache.aget(key)
+    return version
+
+
+# Invalidates everything cached under the version once the current transaction commits
+# incr is atomic on Redis and Memcached; on the file cache it is a get then a set, so two racing bumps
+# can land on the same version and leave one change's entries reachable
+def bump_version(key):
+    def bump():
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, initial_version(), CLASS_VERSION_TIMEOUT)
+    transaction.on_commit(bump)
+
+
+# Current cache version of a class; anything cached for the class embeds it in its key
+def class_version(class_id):
+    return current_version(class_version_key(class_id))
+
+
+async def aclass_version(class_id):
+    return await acurrent_version(class_version_key(class_id))
+
+
+# Versions of several classes with one cache round trip
+def class_versions(class_ids):
+    keys = {class_id: class_version_key(class_id) for class_id in class_ids}
+    found = cache.get_many(keys.values())
+    return {
+        class_id: found[key] if key in found else current_version(key)
+        for class_id, key in keys.items()
+    }
+
+
+# Current cache version of a user's class memberships (enrolled, taught and requested classes)
+def user_version(user_id):
+    return current_version(user_version_key(user_id))
+
+
+def catalog_version():
+    return current_version(CATALOG_VERSION_KEY)
+
+
+def bump_class_version(class_id):
+    bump_version(class_version_key(class_id))
+
+
+def bump_user_version(user_id):
+    bump_version(user_version_key(user_id))
+
+
+def bump_catalog_version():
+    bump_version(CATALOG_VERSION_KEY)
@@ -0,0 +1,6 @@
+from . import rules
+
+
+# Makes the absence threshold available to every template, so the nav and pages quote the live value
+def attendance_rules(request):
+    return {'absence_warning_pct': rules.ABSENCE_WARNING_PCT}
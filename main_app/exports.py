@@ -0,0 +1,50 @@
+import csv
+from .archive import archived_records, with_students
+from .models import Attendance, Class, STATUS_CHOICES
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_HEADER = ['date', 'class', 'student', 'status', 'reason']
+
+STATUS_NAMES = dict(STATUS_CHOICES)
+# Leading characters that make a spreadsheet read a cell as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+# Quotes free text typed by users so spreadsheets show it as text instead of evaluating it
+def spreadsheet_safe(value):
+    if value and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+# File-like object that hands each written CSV line straight back instead of buffering it
+class Echo:
+    def write(self, value):
+        return value
+
+
+# Yields the export as CSV lines, reading Attendance in fixed-size chunks so memory stays flat,
+# then the marks of any archived classes
+def attendance_csv_rows(classes):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_HEADER)
+
+    rows = (
+        Attendance.objects.filter(classid__in=classes)
+        .order_by('classid', 'date', 'id')
+        .values_list('date', 'classid__name', 'student__username', 'status', 'reason')
+    )
+    for day, class_name, username, status, reason in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield writer.writerow([
+            day.isoformat(), spreadsheet_safe(class_name), spreadsheet_safe(username),
+            STATUS_NAMES.get(status, status), spreadsheet_safe(reason or ''),
+        ])
+
+    # Archived classes have no live rows; their marks follow, read from the archive files
+    for class_instance in Class.objects.filter(pk__in=classes, archived_at__isnull=False).order_by('pk'):
+        for record in with_students(archived_records(class_instance)):
+            yield writer.writerow([
+                record.date.isoformat(), spreadsheet_safe(class_instance.name),
+                spreadsheet_safe(record.student.username), STATUS_NAMES.get(record.status, record.status),
+                spreadsheet_safe(record.reason or ''),
+            ])
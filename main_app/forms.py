@@ -1,6 +1,11 @@
 from django import forms
 from django.contrib.auth.models import User
-from .models import Profile, Class, Attendance
+from django.core.files.uploadedfile import UploadedFile
+from django.urls import reverse_lazy
+from django.utils.text import format_lazy
+from .models import Profile, Class, Attendance, STATUS_CHOICES
+from .images import process_upload
+from .jobs import enqueue
 
 # Handles user registration with password confirmation
 class UserRegistrationForm(forms.ModelForm):
@@ -17,12 +22,36 @@ class UserRegistrationForm(forms.ModelForm):
             raise forms.ValidationError("Passwords don't match.")
         return data['password2']
 
-# Allows users to edit their profile details
+# Allows users to edit their profile details; a new photo is normalized on upload and its variants are queued
 class ProfileForm(forms.ModelForm):
     class Meta:
         model = Profile
         fields = ['bio', 'profile_img']
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.previous_image = self.instance.profile_img.name
+
+    def clean_profile_img(self):
+        image = self.cleaned_data['profile_img']
+        if isinstance(image, UploadedFile):
+            return process_upload(image)
+        return image
+
+    # A new image shows as the original until its variants are written; the replaced image and its
+    # variants are deleted, unless it is the default image every new profile shares
+    def save(self, commit=True):
+        replaced = 'profile_img' in self.changed_data
+        if replaced:
+            self.instance.image_variants_ready = False
+        profile = super().save(commit)
+        if commit and replaced:
+            if profile.profile_img:
+                enqueue('profile_image_variants', name=profile.profile_img.name)
+            if self.previous_image and self.previous_image != Profile._meta.get_field('profile_img').default:
+                enqueue('delete_profile_image', name=self.previous_image)
+        return profile
+
 # Used for creating or editing a class
 class ClassForm(forms.ModelForm):
     class Meta:
@@ -39,13 +68,52 @@ class AttendanceForm(forms.ModelForm):
         model = Attendance
         fields = ['student', 'status', 'reason']
 
+# One row of the roll call; the student is checked against the class roster in the view
+class RollCallEntryForm(forms.Form):
+    student = forms.IntegerField(widget=forms.HiddenInput)
+    status = forms.ChoiceField(choices=[('', '---------')] + STATUS_CHOICES)
+    reason = forms.CharField(required=False, widget=forms.Textarea)
+
+# One student's mark for a chosen date, posted from edit_attendance.html
+class EditAttendanceForm(forms.Form):
+    selected_date = forms.DateField()
+    status = forms.ChoiceField(choices=STATUS_CHOICES)
+    reason = forms.CharField(required=False)
+
+# Filters the class attendance records browser
+class AttendanceFilterForm(forms.Form):
+    date_from = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    date_to = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    status = forms.ChoiceField(required=False, choices=[('', 'All statuses')] + STATUS_CHOICES)
+
 # Allows searching for a student by username
 class StudentSearchForm(forms.Form):
     username = forms.CharField(
         max_length=150,
         label='Student username',
-        widget=forms.TextInput(attrs={'placeholder': 'Search for a student'})
+        widget=forms.TextInput(attrs={
+            'placeholder': 'Search for a student',
+            'list': 'student-suggestions',
+            'autocomplete': 'off',
+            'data-typeahead': format_lazy('{}?kind=students', reverse_lazy('search_typeahead')),
+        })
+    )
+
+# Adds many students to a class at once from a pasted list or a CSV of usernames
+class RosterImportForm(forms.Form):
+    usernames = forms.CharField(
+        required=False,
+        label='Usernames',
+        widget=forms.Textarea(attrs={'rows': 6, 'placeholder': 'One username per line, or separated by commas'})
     )
+    roster_file = forms.FileField(required=False, label='CSV file (usernames in the first column)')
+    dry_run = forms.BooleanField(required=False, initial=True, label='Preview only')
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('usernames') and not cleaned_data.get('roster_file'):
+            raise forms.ValidationError("Paste some usernames or upload a CSV file.")
+        return cleaned_data
 
 # Allows teachers to edit class details
 class EditClassForm(forms.ModelForm):
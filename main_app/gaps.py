@@ -0,0 +1,112 @@
+from datetime import date, timedelta
+from django.contrib.auth.models import User
+from django.db import NotSupportedError, connections, router
+from .archive import archived_records
+from .models import Attendance, Class
+
+ENROLLMENT = Class.students.through
+
+# Calendar days of the class as a one-column "days(day)" relation
+DAYS_SQL = {
+    'postgresql': "SELECT generate_series(%s::date, %s::date, interval '1 day')::date AS day",
+    'sqlite': (
+        "WITH RECURSIVE series(day) AS ("
+        " SELECT date(%s) UNION ALL SELECT date(day, '+1 day') FROM series WHERE day < date(%s)"
+        ") SELECT day FROM series"
+    ),
+}
+
+
+# The (student, date) pairs with no attendance mark for a class, computed set-based in SQL
+# Behaves like a sequence so it can be handed straight to a Paginator
+class MissingMarks:
+    def __init__(self, class_instance, student=None, until=None):
+        self.class_instance = class_instance
+        self.student = student
+        self.start = class_instance.start_date
+        self.end = min(class_instance.end_date or date.max, until or date.today())
+        self._count = None
+        self._archived = None
+
+    # The connection Attendance reads go to, so the report follows the replica routing
+    def _connection(self):
+        return connections[router.db_for_read(Attendance)]
+
+    def _sql(self, select, tail=''):
+        vendor = self._connection().vendor
+        if vendor not in DAYS_SQL:
+            raise NotSupportedError(f'The gap report has no calendar query for the {vendor} database.')
+        days = DAYS_SQL[vendor]
+        sql = (
+            f"SELECT {select} FROM {ENROLLMENT._meta.db_table} e"
+            f" CROSS JOIN ({days}) days"
+            f" WHERE e.class_id = %s"
+            f"{' AND e.user_id = %s' if self.student else ''}"
+            f" AND NOT EXISTS (SELECT 1 FROM {Attendance._meta.db_table} a"
+            f" WHERE a.classid_id = e.class_id AND a.student_id = e.user_id AND a.date = days.day)"
+            f"{tail}"
+        )
+        params = [self.start, self.end, self.class_instance.pk]
+        if self.student:
+            params.append(self.student.pk)
+        return sql, params
+
+    def _fetch(self, select, tail='', extra_params=()):
+        if self.start is None or self.start > self.end:
+            return []
+        sql, params = self._sql(select, tail)
+        with self._connection().cursor() as cursor:
+            cursor.execute(sql, params + list(extra_params))
+            return cursor.fetchall()
+
+    # An archived class has no live rows to compare against, so its gaps are worked out from the archive
+    def _archived_rows(self):
+        if self._archived is None:
+            self._archived = []
+            if self.start is not None and self.start <= self.end:
+                student_id = self.student.pk if self.student else None
+                marked = {
+                    (record.student_id, record.date)
+                    for record in archived_records(self.class_instance, student_id=student_id)
+                }
+                students = [student_id] if student_id else sorted(
+                    self.class_instance.students.values_list('pk', flat=True)
+                )
+                days = [self.end - timedelta(days=offset) for offset in range((self.end - self.start).days + 1)]
+                self._archived = [
+                    (student, day) for day in days for student in students if (student, day) not in marked
+                ]
+        return self._archived
+
+    def count(self):
+        if self._count is None:
+            if self.class_instance.archived_at:
+                self._count = len(self._archived_rows())
+            else:
+                rows = self._fetch('COUNT(*)')
+                self._count = rows[0][0] if rows else 0
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    # Returns (student, date) pairs for a slice, newest day first, with the students loaded in one query
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        offset = index.start or 0
+        limit = (index.stop if index.stop is not None else self.count()) - offset
+        if limit <= 0:
+            return []
+
+        if self.class_instance.archived_at:
+            rows = self._archived_rows()[offset:offset + limit]
+        else:
+            rows = self._fetch(
+                'e.user_id, days.day', ' ORDER BY days.day DESC, e.user_id LIMIT %s OFFSET %s', (limit, offset)
+            )
+        students = User.objects.in_bulk({student_id for student_id, _ in rows})
+        return [
+            (students[student_id], day if isinstance(day, date) else date.fromisoformat(day))
+            for student_id, day in rows
+        ]
@@ -0,0 +1,67 @@
+import os
+from io import BytesIO
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+# Longest side kept for the stored original; anything larger is only ever shown scaled down
+MAX_IMAGE_SIZE = 1024
+# Square variants written next to every profile image: 64px for small avatars, 256px for profile pages
+VARIANT_SIZES = (64, 256)
+IMAGE_FORMAT = 'WEBP'
+IMAGE_EXTENSION = '.webp'
+IMAGE_QUALITY = 82
+
+
+# Applies the EXIF orientation and brings the pixels into a mode WebP can store
+def normalized(image):
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+    return image
+
+
+# Re-encodes without carrying over EXIF, ICC or any other metadata from the source
+def encode(image):
+    buffer = BytesIO()
+    image.save(buffer, IMAGE_FORMAT, quality=IMAGE_QUALITY, method=6)
+    return buffer.getvalue()
+
+
+def variant_name(name, size):
+    root, _ = os.path.splitext(name)
+    return f'{root}_{size}{IMAGE_EXTENSION}'
+
+
+# Turns an uploaded file into an upright, metadata-free WebP capped at MAX_IMAGE_SIZE
+def process_upload(upload):
+    with Image.open(upload) as image:
+        image = normalized(image)
+        image.thumbnail((MAX_IMAGE_SIZE, MAX_IMAGE_SIZE))
+        root, _ = os.path.splitext(os.path.basename(upload.name))
+        return ContentFile(encode(image), name=f'{root}{IMAGE_EXTENSION}')
+
+
+# Writes the square variants of a stored image, replacing any earlier ones
+def write_variants(name, storage=default_storage):
+    with storage.open(name) as source, Image.open(source) as image:
+        image = normalized(image)
+        for size in VARIANT_SIZES:
+            target = variant_name(name, size)
+            if storage.exists(target):
+                storage.delete(target)
+            storage.save(target, ContentFile(encode(ImageOps.fit(image, (size, size)))))
+
+
+# URL of a variant, falling back to the original until the variants have been written; `ready`
+# comes from the profile, so rendering never has to ask the storage
+def variant_url(field_file, size, ready):
+    if ready:
+        return field_file.storage.url(variant_name(field_file.name, size))
+    return field_file.url
+
+
+# Deletes a stored image together with its variants
+def delete_image(name, storage=default_storage):
+    for target in (name, *(variant_name(name, size) for size in VARIANT_SIZES)):
+        storage.delete(target)
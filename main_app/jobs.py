@@ -0,0 +1,87 @@
+import logging
+import traceback
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# Job kind -> handler, filled in by the @job decorator in tasks.py
+HANDLERS = {}
+RETRY_BASE_SECONDS = 30
+# A Running job not finished within this long is presumed lost with its worker and is claimed again
+JOB_TIMEOUT = timedelta(minutes=10)
+# How long finished jobs are kept for inspection before the worker deletes them
+DONE_JOB_RETENTION = timedelta(days=7)
+
+
+def job(kind):
+    def register(handler):
+        HANDLERS[kind] = handler
+        return handler
+    return register
+
+
+# Queues a job in the caller's transaction, so it only exists if the work that asked for it commits
+def enqueue(kind, **payload):
+    return Job.objects.create(kind=kind, payload=payload)
+
+
+# Marks up to `limit` due jobs as Running and returns them; SKIP LOCKED lets several workers
+# claim side by side on PostgreSQL
+def claim_jobs(limit):
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status='Pending', run_after__lte=now)
+                | Q(status='Running', locked_at__lt=now - JOB_TIMEOUT)
+            )
+            .order_by('run_after')[:limit]
+        )
+        Job.objects.filter(pk__in=[claimed.pk for claimed in jobs]).update(
+            status='Running', locked_at=now, attempts=F('attempts') + 1,
+        )
+    for claimed in jobs:
+        claimed.status = 'Running'
+        claimed.locked_at = now
+        claimed.attempts += 1
+    return jobs
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+
+
+# Runs one claimed job; its database writes and the Done mark commit together, and a failure
+# rolls them back and schedules a retry, or parks the job as Dead once out of attempts
+def run_job(claimed):
+    try:
+        handler = HANDLERS.get(claimed.kind)
+        if handler is None:
+            raise LookupError(f'No handler is registered for job kind "{claimed.kind}".')
+        with transaction.atomic():
+            handler(**claimed.payload)
+            Job.objects.filter(pk=claimed.pk).update(status='Done', finished_at=timezone.now(), last_error='')
+        return True
+    except Exception:
+        logger.exception('Job %s failed (attempt %s of %s)', claimed, claimed.attempts, claimed.max_attempts)
+        now = timezone.now()
+        failed = Job.objects.filter(pk=claimed.pk)
+        if claimed.attempts >= claimed.max_attempts:
+            failed.update(status='Dead', finished_at=now, last_error=traceback.format_exc())
+        else:
+            failed.update(
+                status='Pending', locked_at=None, run_after=now + retry_delay(claimed.attempts),
+                last_error=traceback.format_exc(),
+            )
+        return False
+
+
+# Deletes Done jobs that finished longer than `keep` ago; Dead jobs stay until requeued or handled
+def purge_done_jobs(keep=DONE_JOB_RETENTION):
+    deleted, _ = Job.objects.filter(status='Done', finished_at__lt=timezone.now() - keep).delete()
+    return deleted
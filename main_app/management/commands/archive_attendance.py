@@ -0,0 +1,93 @@
+from collections import defaultdict
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from main_app.archive import archived_records, delete_archive, read_archive, write_archive
+from main_app.models import Attendance, Class
+from main_app.rollups import refresh_unit, term_start
+
+GRACE_DAYS = 30
+RESTORE_BATCH_SIZE = 5000
+ARCHIVE_FIELDS = ('id', 'student_id', 'date', 'status', 'reason')
+
+
+class Command(BaseCommand):
+    help = 'Moves the attendance of classes that ended more than --grace-days ago out of the live table into ' \
+           'one compressed column file per class under ATTENDANCE_ARCHIVE_ROOT. History pages, exports and ' \
+           'analytics read archived classes from those files. --restore moves classes back.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-days', type=int, default=GRACE_DAYS,
+                            help='Only archive classes that ended at least this many days ago.')
+        parser.add_argument('--class', dest='class_ids', type=int, action='append', help='Limit to a class id (repeatable).')
+        parser.add_argument('--dry-run', action='store_true', help='List the classes that would be archived.')
+        parser.add_argument('--restore', action='store_true', help='Move the given --class ids back into the live table.')
+
+    def handle(self, *args, grace_days=GRACE_DAYS, class_ids=None, dry_run=False, restore=False, **options):
+        if restore:
+            if not class_ids:
+                raise CommandError('--restore needs the --class ids to bring back.')
+            for class_instance in Class.objects.filter(pk__in=class_ids, archived_at__isnull=False).order_by('pk'):
+                restored = self.restore_class(class_instance)
+                self.stdout.write(f'Restored {restored} attendance rows of {class_instance.name}.')
+            return
+
+        cutoff = timezone.now().date() - timedelta(days=grace_days)
+        classes = Class.objects.filter(archived_at__isnull=True, end_date__lt=cutoff).order_by('pk')
+        if class_ids:
+            classes = classes.filter(pk__in=class_ids)
+
+        archived = moved = 0
+        for class_instance in classes:
+            if dry_run:
+                rows = Attendance.objects.filter(classid=class_instance).count()
+                self.stdout.write(f'Would archive {rows} attendance rows of {class_instance.name} (ended {class_instance.end_date}).')
+                continue
+            moved += self.archive_class(class_instance)
+            archived += 1
+            self.stdout.write(f'Archived {class_instance.name}.')
+
+        if not dry_run:
+            self.stdout.write(self.style.SUCCESS(f'Archived {archived} classes, moving {moved} attendance rows.'))
+
+    # Writes the class's archive file and deletes its live rows in one transaction; if anything
+    # fails (including a mark added meanwhile) the rows stay live and the file is removed
+    def archive_class(self, class_instance):
+        try:
+            with transaction.atomic():
+                rows = list(
+                    Attendance.objects.select_for_update().filter(classid=class_instance).values_list(*ARCHIVE_FIELDS)
+                )
+
+                # The rollups stay behind for the trend charts, so bring them fully up to date first
+                terms = defaultdict(set)
+                for row in rows:
+                    terms[term_start(row[2])].add(row[2])
+                for start, days in sorted(terms.items()):
+                    refresh_unit(class_instance.pk, start, days)
+
+                write_archive(class_instance.pk, rows)
+                if len(read_archive(class_instance.pk)['id']) != len(rows):
+                    raise CommandError(f'The archive of {class_instance.name} did not read back complete.')
+
+                deleted, _ = Attendance.objects.filter(classid=class_instance).delete()
+                if deleted != len(rows):
+                    raise CommandError(f'{class_instance.name} was marked while being archived; run again.')
+
+                class_instance.archived_at = timezone.now()
+                class_instance.save(update_fields=['archived_at'])
+        except Exception:
+            delete_archive(class_instance.pk)
+            raise
+        return len(rows)
+
+    # Puts the archived rows back into the live table, with their original ids
+    def restore_class(self, class_instance):
+        records = archived_records(class_instance)
+        with transaction.atomic():
+            Attendance.objects.bulk_create(records, batch_size=RESTORE_BATCH_SIZE)
+            class_instance.archived_at = None
+            class_instance.save(update_fields=['archived_at'])
+            transaction.on_commit(lambda: delete_archive(class_instance.pk))
+        return len(records)
@@ -0,0 +1,85 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Q
+from main_app.attendance import refresh_standing
+from main_app.models import Attendance, AttendanceTally, TALLY_FIELDS
+
+BATCH_SIZE = 1000
+
+
+# Counts every (student, class) pair straight from the raw Attendance rows
+def counted_tallies(class_ids=None):
+    rows = Attendance.objects.all()
+    if class_ids:
+        rows = rows.filter(classid__in=class_ids)
+    rows = rows.values('student', 'classid').annotate(**{
+        field: Count('pk', filter=Q(status=status)) for status, field in TALLY_FIELDS.items()
+    }).order_by()
+    for row in rows.iterator(chunk_size=BATCH_SIZE):
+        yield (row['student'], row['classid']), tuple(row[field] for field in TALLY_FIELDS.values())
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the per-student/per-class attendance tallies from Attendance, or verifies them with --verify.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true', help='Only report tallies that disagree with Attendance.')
+        parser.add_argument('--class', dest='class_ids', type=int, action='append', help='Limit to a class id (repeatable).')
+
+    def handle(self, *args, verify=False, class_ids=None, **options):
+        if verify:
+            self.verify(class_ids)
+        else:
+            self.rebuild(class_ids)
+
+    def rebuild(self, class_ids):
+        with transaction.atomic():
+            # Archived classes have no live rows to count; their tallies are kept as they were
+            stale = AttendanceTally.objects.filter(classid__archived_at__isnull=True)
+            if class_ids:
+                stale = stale.filter(classid__in=class_ids)
+            students = set(stale.values_list('student', flat=True))
+            stale.delete()
+
+            batch, written = [], 0
+            for (student_id, class_id), counts in counted_tallies(class_ids):
+                students.add(student_id)
+                batch.append(AttendanceTally(
+                    student_id=student_id, classid_id=class_id, **dict(zip(TALLY_FIELDS.values(), counts))
+                ))
+                if len(batch) >= BATCH_SIZE:
+                    AttendanceTally.objects.bulk_create(batch)
+                    written += len(batch)
+                    batch = []
+            AttendanceTally.objects.bulk_create(batch)
+            written += len(batch)
+
+            # The nav's standing flags are derived from the tallies
+            students = sorted(students)
+            for offset in range(0, len(students), BATCH_SIZE):
+                refresh_standing(students[offset:offset + BATCH_SIZE])
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} attendance tallies.'))
+
+    def verify(self, class_ids):
+        stored_qs = AttendanceTally.objects.filter(classid__archived_at__isnull=True)
+        if class_ids:
+            stored_qs = stored_qs.filter(classid__in=class_ids)
+        stored = {
+            (row[0], row[1]): tuple(row[2:])
+            for row in stored_qs.values_list('student', 'classid', *TALLY_FIELDS.values()).iterator(chunk_size=BATCH_SIZE)
+        }
+
+        mismatches = 0
+        for key, counts in counted_tallies(class_ids):
+            if stored.pop(key, None) != counts:
+                mismatches += 1
+                self.stdout.write(f'student={key[0]} class={key[1]}: expected {counts}')
+        for key, counts in stored.items():
+            if any(counts):
+                mismatches += 1
+                self.stdout.write(f'student={key[0]} class={key[1]}: stored {counts} but no attendance')
+
+        if mismatches:
+            raise CommandError(f'{mismatches} attendance tallies are out of date; run without --verify to rebuild.')
+        self.stdout.write(self.style.SUCCESS('All attendance tallies match.'))
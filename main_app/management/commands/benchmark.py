@@ -0,0 +1,202 @@
+import json
+import statistics
+import subprocess
+import time
+from contextlib import ExitStack
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from main_app.middleware import QueryRecorder
+from main_app.models import Class, Attendance, JoinRequest
+from .loadtest import percentile
+
+# A route is a regression when its query count grows, or its p95 grows by more than the tolerance and this many ms
+NOISE_MS = 1.0
+
+
+# Every page that only reads, as (label, role, route name, url args); pages that write are left out so
+# repeated runs see the same data
+def benchmark_routes(class_instance, student):
+    class_pk, student_pk = class_instance.pk, student.pk
+    return [
+        ('home', None, 'home', []),
+        ('login', None, 'login', []),
+        ('signup', None, 'signup', []),
+        ('profile', 'teacher', 'profile', []),
+        ('edit_profile', 'student', 'edit_profile', []),
+        ('profile_detail', 'teacher', 'profile_detail', [student_pk]),
+        ('student_profile', 'teacher', 'student_profile', [class_pk, student_pk]),
+        ('create_class', 'teacher', 'create_class', []),
+        ('class_detail (teacher)', 'teacher', 'class_detail', [class_pk]),
+        ('class_detail (student)', 'student', 'class_detail', [class_pk]),
+        ('manage_classes', 'teacher', 'manage_classes', []),
+        ('edit_class', 'teacher', 'edit_class', [class_pk]),
+        ('delete_class', 'teacher', 'delete_class', [class_pk]),
+        ('add_student', 'teacher', 'add_student', [class_pk]),
+        ('import_roster', 'teacher', 'import_roster', [class_pk]),
+        ('search_classes', 'student', 'search_classes', []),
+        ('search_typeahead', 'teacher', 'search_typeahead', []),
+        ('view_classes', 'student', 'view_classes', []),
+        ('manage_join_requests', 'teacher', 'manage_join_requests', [class_pk]),
+        ('edit_attendance', 'teacher', 'edit_attendance', [class_pk, student_pk]),
+        ('mark_attendance_inline', 'teacher', 'mark_attendance_inline', [class_pk, student_pk]),
+        ('attendance_records', 'teacher', 'attendance_records', [class_pk]),
+        ('class_gap_report', 'teacher', 'class_gap_report', [class_pk]),
+        ('class_matrix', 'teacher', 'class_matrix', [class_pk]),
+        ('class_analytics', 'teacher', 'class_analytics', [class_pk]),
+        ('term_report', 'teacher', 'term_report', []),
+        ('export_class_attendance', 'teacher', 'export_class_attendance', [class_pk]),
+        ('export_teacher_attendance', 'teacher', 'export_teacher_attendance', []),
+        ('student_attendance_records', 'student', 'student_attendance_records', []),
+        ('student_class_attendance', 'student', 'student_class_attendance', [class_pk]),
+    ]
+
+
+# Requests the url once, reading a streamed body to the end, and returns (seconds, queries, status)
+def timed_request(client, url):
+    recorder = QueryRecorder()
+    with ExitStack() as stack:
+        for db in connections.all():
+            stack.enter_context(db.execute_wrapper(recorder))
+        started = time.perf_counter()
+        response = client.get(url)
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        elapsed = time.perf_counter() - started
+    return elapsed, recorder.count, response.status_code
+
+
+def current_commit():
+    try:
+        result = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+
+class Command(BaseCommand):
+    help = 'Drives every read-only page through the test client against the current database (seed it first ' \
+           'with "manage.py seed") and reports p50/p95 latency and query counts. Save a run with --json and ' \
+           'check a later commit against it with --compare.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help='Timed requests per page.')
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed requests per page before timing.')
+        parser.add_argument('--cold-cache', action='store_true', help='Clear the cache before every request.')
+        parser.add_argument('--class', dest='class_id', type=int, help='Class to benchmark (default: the largest).')
+        parser.add_argument('--route', dest='routes', action='append', help='Only benchmark this page label (repeatable).')
+        parser.add_argument('--json', dest='json_path', help='Write the results to this file.')
+        parser.add_argument('--compare', help='Results file of an earlier run to compare against.')
+        parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed p95 slowdown against --compare, e.g. 0.2 for 20%%.')
+
+    def handle(self, *args, iterations=20, warmup=2, cold_cache=False, class_id=None, routes=None,
+               json_path=None, compare=None, tolerance=0.2, **options):
+        classes = Class.objects.annotate(enrolled=Count('students')).filter(enrolled__gt=0)
+        if class_id:
+            classes = classes.filter(pk=class_id)
+        class_instance = classes.select_related('teacher').order_by('-enrolled', 'pk').first()
+        if class_instance is None:
+            raise CommandError('No class with enrolled students to benchmark; run "manage.py seed" first.')
+        student = class_instance.students.order_by('pk').first()
+
+        selected = [route for route in benchmark_routes(class_instance, student) if not routes or route[0] in routes]
+        if not selected:
+            raise CommandError('No page matches --route.')
+
+        clients = {None: Client(), 'teacher': Client(), 'student': Client()}
+        clients['teacher'].force_login(class_instance.teacher)
+        clients['student'].force_login(student)
+
+        results = {}
+        self.stdout.write(
+            f'Class {class_instance.pk} ({class_instance.enrolled} students), '
+            f'teacher {class_instance.teacher.username}, student {student.username}'
+        )
+        self.stdout.write(f'{"page":<30}{"p50 ms":>10}{"p95 ms":>10}{"queries":>9}{"status":>8}')
+        # The test client's host is not in ALLOWED_HOSTS outside the test runner
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for label, role, name, url_args in selected:
+                url = reverse(name, args=url_args)
+                client = clients[role]
+                for _ in range(warmup):
+                    if cold_cache:
+                        cache.clear()
+                    timed_request(client, url)
+
+                timings, queries, status = [], 0, None
+                for _ in range(iterations):
+                    if cold_cache:
+                        cache.clear()
+                    elapsed, queries, status = timed_request(client, url)
+                    timings.append(elapsed * 1000)
+                timings.sort()
+                results[label] = {
+                    'url': url,
+                    'p50_ms': round(statistics.median(timings), 2),
+                    'p95_ms': round(percentile(timings, 95), 2),
+                    'queries': queries,
+                    'status': status,
+                }
+                self.stdout.write(
+                    f'{label:<30}{results[label]["p50_ms"]:>10.1f}{results[label]["p95_ms"]:>10.1f}'
+                    f'{queries:>9}{status:>8}'
+                )
+
+        report = {
+            'commit': current_commit(),
+            'created': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'iterations': iterations,
+            'cold_cache': cold_cache,
+            'data': {
+                'users': User.objects.count(),
+                'classes': Class.objects.count(),
+                'attendance': Attendance.objects.count(),
+                'pending_join_requests': JoinRequest.objects.filter(status='Pending').count(),
+            },
+            'routes': results,
+        }
+        if json_path:
+            with open(json_path, 'w') as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(f'Wrote {json_path}.')
+        if compare:
+            self.compare(report, compare, tolerance)
+
+    def compare(self, report, path, tolerance):
+        with open(path) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get('cold_cache') != report['cold_cache']:
+            raise CommandError(f'{path} was run with a {"cold" if baseline.get("cold_cache") else "warm"} cache; '
+                               f'compare runs made the same way.')
+
+        self.stdout.write(f'\nAgainst {baseline.get("commit") or path}:')
+        self.stdout.write(f'{"page":<30}{"p95 ms":>20}{"queries":>12}')
+        regressions = []
+        for label, now in report['routes'].items():
+            before = baseline['routes'].get(label)
+            if before is None:
+                continue
+            slower = now['p95_ms'] > before['p95_ms'] * (1 + tolerance) and now['p95_ms'] - before['p95_ms'] > NOISE_MS
+            more_queries = now['queries'] > before['queries']
+            flag = '  REGRESSION' if slower or more_queries else ''
+            if flag:
+                regressions.append(label)
+            self.stdout.write(
+                f'{label:<30}{before["p95_ms"]:>9.1f} ->{now["p95_ms"]:>7.1f}'
+                f'{before["queries"]:>5} ->{now["queries"]:>3}{flag}'
+            )
+
+        if regressions:
+            raise CommandError(f'{len(regressions)} pages regressed: {", ".join(regressions)}.')
+        self.stdout.write(self.style.SUCCESS('No regressions.'))
@@ -0,0 +1,79 @@
+import json
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from main_app.models import Attendance, JoinRequest
+
+
+# Attendance columns that exist at every migration, so the same queries plan before and after migrating
+BASELINE_COLUMNS = ('id', 'student_id', 'classid_id', 'date', 'status')
+
+
+# The queries the views run on every roll call, dashboard and join-request page
+def hot_queries(sample):
+    attendance = Attendance.objects.only(*BASELINE_COLUMNS)
+    return [
+        ('Attendance by class and date (roll call)',
+         attendance.filter(classid_id=sample.classid_id, date=sample.date)),
+        ('Attendance by student, class and status (lateness rules)',
+         attendance.filter(student_id=sample.student_id, classid_id=sample.classid_id, status='L')),
+        ('Attendance by student and date (student history)',
+         attendance.filter(student_id=sample.student_id).order_by('-date')),
+        ('Attendance for one student, class and day (upsert key)',
+         attendance.filter(student_id=sample.student_id, classid_id=sample.classid_id, date=sample.date)),
+        ('Pending join requests for a class',
+         JoinRequest.objects.filter(classid_id=sample.classid_id, status='Pending')),
+        ('Pending join requests for a student',
+         JoinRequest.objects.filter(student_id=sample.student_id, status='Pending')),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Prints the query plan and timing of the hot attendance/join-request queries. Save a run with ' \
+           '--json before migrating and pass it to --compare afterwards to see each plan and timing side by side.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--analyze', action='store_true', help='Run EXPLAIN ANALYZE (PostgreSQL only).')
+        parser.add_argument('--repeat', type=int, default=20, help='Executions per query for the timing.')
+        parser.add_argument('--json', dest='json_path', help='Write the plans and timings to this file.')
+        parser.add_argument('--compare', help='Plans file of an earlier run to show next to this one.')
+
+    def handle(self, *args, analyze=False, repeat=20, json_path=None, compare=None, **options):
+        sample = Attendance.objects.only(*BASELINE_COLUMNS).order_by('-pk').first()
+        if sample is None:
+            raise CommandError('There is no attendance data to plan against.')
+
+        baseline = {}
+        if compare:
+            with open(compare) as baseline_file:
+                baseline = json.load(baseline_file)
+
+        explain_options = {'analyze': True} if analyze and connection.vendor == 'postgresql' else {}
+
+        results = {}
+        for title, queryset in hot_queries(sample):
+            started = time.perf_counter()
+            for _ in range(repeat):
+                list(queryset[:100])
+            elapsed_ms = (time.perf_counter() - started) * 1000 / repeat
+            plan = queryset.explain(**explain_options)
+            results[title] = {'ms': round(elapsed_ms, 3), 'plan': plan}
+
+            before = baseline.get(title)
+            if before is None:
+                self.stdout.write(self.style.MIGRATE_HEADING(f'{title}  ({elapsed_ms:.2f} ms/query)'))
+                self.stdout.write(plan)
+            else:
+                self.stdout.write(self.style.MIGRATE_HEADING(
+                    f'{title}  ({before["ms"]:.2f} -> {elapsed_ms:.2f} ms/query)'
+                ))
+                if before['plan'] == plan:
+                    self.stdout.write(f'Plan unchanged:\n{plan}')
+                else:
+                    self.stdout.write(f'Before:\n{before["plan"]}\nAfter:\n{plan}')
+            self.stdout.write('')
+
+        if json_path:
+            with open(json_path, 'w') as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(f'Wrote {json_path}.')
@@ -0,0 +1,107 @@
+import re
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import HTTPRedirectHandler, Request, build_opener
+from django.core.management.base import BaseCommand, CommandError
+
+DEFAULT_PATHS = ['/classes/', '/attendance/']
+
+
+class NoRedirect(HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+OPENER = build_opener(NoRedirect)
+
+
+def fetch(url, cookies='', data=None):
+    request = Request(url, data=data, headers={'Cookie': cookies})
+    try:
+        response = OPENER.open(request, timeout=30)
+    except HTTPError as error:
+        # Redirects surface as HTTPError because NoRedirect refuses to follow them
+        response = error
+    with response:
+        return response.status, response.headers.get_all('Set-Cookie') or [], response.read()
+
+
+def cookie_header(set_cookies, jar=None):
+    jar = jar or SimpleCookie()
+    for header in set_cookies:
+        jar.load(header)
+    return jar, '; '.join(f'{name}={morsel.value}' for name, morsel in jar.items())
+
+
+# Signs in through the login form and returns the Cookie header of the session
+def sign_in(base_url, username, password):
+    _, set_cookies, body = fetch(f'{base_url}/login/')
+    jar, cookies = cookie_header(set_cookies)
+    token = re.search(rb'name="csrfmiddlewaretoken" value="([^"]+)"', body)
+    if token is None:
+        raise CommandError(f'No login form found at {base_url}/login/.')
+
+    form = urlencode({
+        'username': username, 'password': password, 'csrfmiddlewaretoken': token.group(1).decode(),
+    }).encode()
+    status, set_cookies, _ = fetch(f'{base_url}/login/', cookies, form)
+    jar, cookies = cookie_header(set_cookies, jar)
+    if status != 302 or 'sessionid' not in jar:
+        raise CommandError(f'Could not sign in to {base_url} as {username}.')
+    return cookies
+
+
+def timed_fetch(url, cookies):
+    started = time.perf_counter()
+    status, _, _ = fetch(url, cookies)
+    return time.perf_counter() - started, status
+
+
+def percentile(latencies, pct):
+    return latencies[min(len(latencies) - 1, int(len(latencies) * pct / 100))]
+
+
+class Command(BaseCommand):
+    help = 'Load-tests running servers with concurrent signed-in requests and compares requests/sec and latency. ' \
+           'Start the app under both servers first, e.g. ' \
+           '"gunicorn GA_Attendance.wsgi -w 2 --threads 8 -b :8000" and ' \
+           '"uvicorn GA_Attendance.asgi:application --workers 2 --port 8001", then run ' \
+           '"loadtest --target wsgi=http://127.0.0.1:8000 --target asgi=http://127.0.0.1:8001 --username ... --password ...".'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', action='append', required=True, help='name=base_url of a running server (repeatable).')
+        parser.add_argument('--path', dest='paths', action='append', help=f'Path to request (repeatable, default {DEFAULT_PATHS}).')
+        parser.add_argument('--username', required=True, help='User to sign in as, e.g. a student.')
+        parser.add_argument('--password', required=True)
+        parser.add_argument('--concurrency', type=int, default=100, help='Requests in flight at once.')
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per target.')
+
+    def handle(self, *args, target, paths=None, username, password, concurrency=100, requests=2000, **options):
+        paths = paths or DEFAULT_PATHS
+        targets = []
+        for spec in target:
+            name, _, base_url = spec.partition('=')
+            if not base_url:
+                raise CommandError(f'--target must look like name=http://host:port, not "{spec}".')
+            targets.append((name, base_url.rstrip('/')))
+
+        self.stdout.write(f'{"server":<10}{"req/s":>10}{"p50 ms":>10}{"p99 ms":>10}{"errors":>8}')
+        for name, base_url in targets:
+            cookies = sign_in(base_url, username, password)
+            urls = [f'{base_url}{paths[i % len(paths)]}' for i in range(requests)]
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                results = list(pool.map(lambda url: timed_fetch(url, cookies), urls))
+            elapsed = time.perf_counter() - started
+
+            latencies = sorted(latency for latency, _ in results)
+            errors = sum(1 for _, status in results if status != 200)
+            self.stdout.write(
+                f'{name:<10}{requests / elapsed:>10.1f}'
+                f'{statistics.median(latencies) * 1000:>10.1f}{percentile(latencies, 99) * 1000:>10.1f}{errors:>8}'
+            )
@@ -0,0 +1,69 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import django
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from main_app.images import IMAGE_EXTENSION, VARIANT_SIZES, delete_image, process_upload, variant_name, write_variants
+from main_app.models import Profile
+
+
+# Runs in a worker process: re-encodes the stored image (unless it is shared, like the field default)
+# and writes its variants; returns the name the image ends up stored under
+def process_stored_image(name, reencode, force):
+    reencode = reencode and not name.endswith(IMAGE_EXTENSION)
+    if not force and not reencode and all(
+        default_storage.exists(variant_name(name, size)) for size in VARIANT_SIZES
+    ):
+        return name, name
+
+    new_name = name
+    if reencode:
+        with default_storage.open(name) as original:
+            processed = process_upload(original)
+        new_name = default_storage.save(os.path.join(os.path.dirname(name), processed.name), processed)
+    write_variants(new_name)
+    return name, new_name
+
+
+class Command(BaseCommand):
+    help = 'Normalizes existing profile images and writes their resized variants, spread over a process pool.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Worker processes (default: one per CPU).')
+        parser.add_argument('--force', action='store_true', help='Regenerate variants that already exist.')
+
+    def handle(self, *args, workers=None, force=False, **options):
+        default_image = Profile._meta.get_field('profile_img').default
+        names = set(Profile.objects.exclude(profile_img='').values_list('profile_img', flat=True).distinct())
+
+        # Worker processes must not inherit open database connections
+        connections.close_all()
+
+        renamed, processed, failed = {}, [], 0
+        with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+            futures = {
+                pool.submit(process_stored_image, name, name != default_image, force): name
+                for name in sorted(names)
+            }
+            for future in as_completed(futures):
+                try:
+                    old_name, new_name = future.result()
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(f'{futures[future]}: {error}')
+                    continue
+                processed.append(new_name)
+                if new_name != old_name:
+                    renamed[old_name] = new_name
+
+        with transaction.atomic():
+            for old_name, new_name in renamed.items():
+                Profile.objects.filter(profile_img=old_name).update(profile_img=new_name)
+            Profile.objects.filter(profile_img__in=processed).update(image_variants_ready=True)
+        for old_name in renamed:
+            delete_image(old_name)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {len(names) - failed} profile images ({len(renamed)} re-encoded, {failed} failed).'
+        ))
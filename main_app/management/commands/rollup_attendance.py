@@ -0,0 +1,71 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from main_app.models import RollupState
+from main_app.rollups import ROLLUP_STATE, SETTLE_TIME, changed_units, refresh_unit
+
+BATCH_SIZE = 50
+
+
+def encode_cursor(class_id, start):
+    return f"{class_id}.{start.isoformat()}"
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    class_id, start = cursor.split('.')
+    return int(class_id), date.fromisoformat(start)
+
+
+def parse_date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f'"{value}" is not a YYYY-MM-DD date.')
+
+
+class Command(BaseCommand):
+    help = 'Brings the daily and per-term attendance rollups up to date with the days changed since the last run. ' \
+           'Each batch commits on its own, and an interrupted run resumes after the last committed batch.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=parse_date, help='Recompute every day from this date on (YYYY-MM-DD).')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Class terms rolled up per transaction.')
+        parser.add_argument('--restart', action='store_true', help='Discard an interrupted run instead of resuming it.')
+
+    def handle(self, *args, since=None, batch_size=BATCH_SIZE, restart=False, **options):
+        state, _ = RollupState.objects.get_or_create(name=ROLLUP_STATE)
+
+        resume_after = None
+        if state.run_until and state.run_since == since and not restart:
+            resume_after = decode_cursor(state.cursor)
+            self.stdout.write(f'Resuming the run up to {state.run_until}.')
+        else:
+            state.run_until = timezone.now() - SETTLE_TIME
+            state.run_since = since
+            state.cursor = ''
+            state.save()
+
+        units = changed_units(None if since else state.watermark, state.run_until, since)
+        if resume_after:
+            units = [unit for unit in units if unit[0] > resume_after]
+
+        for offset in range(0, len(units), batch_size):
+            batch = units[offset:offset + batch_size]
+            with transaction.atomic():
+                for (class_id, start), days in batch:
+                    refresh_unit(class_id, start, days)
+                state.cursor = encode_cursor(*batch[-1][0])
+                state.save(update_fields=['cursor'])
+            self.stdout.write(f'Rolled up {offset + len(batch)}/{len(units)} class terms.')
+
+        # A --since run only covers its window, so older changes still wait for the next incremental run
+        if since is None:
+            state.watermark = state.run_until
+        state.run_until = None
+        state.run_since = None
+        state.cursor = ''
+        state.save()
+        self.stdout.write(self.style.SUCCESS(f'Rolled up {len(units)} class terms.'))
@@ -0,0 +1,65 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+from main_app import tasks  # noqa: F401  (registers the job handlers)
+from main_app.jobs import DONE_JOB_RETENTION, claim_jobs, purge_done_jobs, run_job
+from main_app.models import Job
+
+BATCH_SIZE = 10
+IDLE_SLEEP_SECONDS = 2.0
+# How often an idle worker deletes old Done jobs
+PURGE_INTERVAL_SECONDS = 60 * 60
+
+
+class Command(BaseCommand):
+    help = 'Runs queued background jobs from the database until stopped, or until the queue is empty with --once.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit as soon as no job is due.')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Jobs claimed per round.')
+        parser.add_argument('--sleep', type=float, default=IDLE_SLEEP_SECONDS, help='Seconds to wait when idle.')
+        parser.add_argument('--requeue-dead', action='store_true', help='Give every Dead job a fresh set of attempts, then exit.')
+        parser.add_argument('--keep-done-days', type=int, default=DONE_JOB_RETENTION.days,
+                            help='Delete Done jobs that finished more than this many days ago.')
+        parser.add_argument('--purge-done', action='store_true', help='Delete old Done jobs, then exit.')
+
+    def handle(self, *args, once=False, batch_size=BATCH_SIZE, sleep=IDLE_SLEEP_SECONDS, requeue_dead=False,
+               keep_done_days=DONE_JOB_RETENTION.days, purge_done=False, **options):
+        keep = timedelta(days=keep_done_days)
+        if purge_done:
+            purged = purge_done_jobs(keep)
+            self.stdout.write(self.style.SUCCESS(f'Deleted {purged} finished jobs.'))
+            return
+
+        if requeue_dead:
+            requeued = Job.objects.filter(status='Dead').update(
+                status='Pending', attempts=0, run_after=timezone.now(), finished_at=None,
+            )
+            self.stdout.write(self.style.SUCCESS(f'Requeued {requeued} dead jobs.'))
+            return
+
+        done = failed = 0
+        purged_at = None
+        try:
+            while True:
+                close_old_connections()
+                jobs = claim_jobs(batch_size)
+                if not jobs:
+                    if purged_at is None or time.monotonic() - purged_at >= PURGE_INTERVAL_SECONDS:
+                        purge_done_jobs(keep)
+                        purged_at = time.monotonic()
+                    if once:
+                        break
+                    time.sleep(sleep)
+                    continue
+                for claimed in jobs:
+                    if run_job(claimed):
+                        done += 1
+                    else:
+                        failed += 1
+                        self.stderr.write(f'{claimed} failed.')
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Ran {done} jobs, {failed} failed.'))
@@ -0,0 +1,160 @@
+import random
+from datetime import timedelta
+from io import StringIO
+from itertools import islice
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from main_app.models import Profile, Class, Attendance, JoinRequest
+
+BATCH_SIZE = 5000
+SUBJECTS = ['Algebra', 'Biology', 'Chemistry', 'Design', 'English', 'French', 'Geography', 'History',
+            'Music', 'Physics', 'Programming', 'Statistics']
+# Mondays and Fridays see more absences than midweek days
+WEEKDAY_ABSENCE_FACTOR = [1.4, 1.0, 0.9, 1.0, 1.3]
+EXCUSED_RATE = 0.02
+
+
+# The last `count` weekdays up to and including `end`, oldest first
+def school_days(end, count):
+    days = []
+    day = end
+    while len(days) < count:
+        if day.weekday() < 5:
+            days.append(day)
+        day -= timedelta(days=1)
+    return days[::-1]
+
+
+# How likely a student is to be absent and to be late on an ordinary day. Most students are reliable
+# and a long tail is not, so a few students carry most of the absences and lates, as in production
+def student_habits(rng):
+    risk = rng.betavariate(1.2, 10)
+    return risk * 0.6, risk * 0.8
+
+
+def mark(rng, habits, day):
+    absent_rate, late_rate = habits
+    roll = rng.random()
+    absent_rate *= WEEKDAY_ABSENCE_FACTOR[day.weekday()]
+    if roll < absent_rate:
+        return 'A'
+    if roll < absent_rate + late_rate:
+        return 'L'
+    if roll < absent_rate + late_rate + EXCUSED_RATE:
+        return 'E'
+    return 'P'
+
+
+class Command(BaseCommand):
+    help = 'Bulk-generates realistic teachers, students, classes, attendance and join requests for local ' \
+           'benchmarking. With the defaults it writes about 1.2M attendance rows; production scale is ' \
+           '"--students 20000 --classes 1000 --class-size 50 --days 200" (10M rows).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=2000)
+        parser.add_argument('--teachers', type=int, default=50)
+        parser.add_argument('--classes', type=int, default=200)
+        parser.add_argument('--class-size', type=int, default=30, help='Average number of students per class.')
+        parser.add_argument('--days', type=int, default=200, help='School days marked in each class.')
+        parser.add_argument('--ended', type=float, default=0.25, help='Share of classes that ended in an earlier term.')
+        parser.add_argument('--pending', type=int, default=5, help='Average pending join requests per class.')
+        parser.add_argument('--password', default='seed-password', help='Password of every seeded user.')
+        parser.add_argument('--prefix', default='seed', help='Username prefix of seeded users.')
+        parser.add_argument('--random-seed', type=int, default=0, help='Seed for the random generator.')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Rows per INSERT.')
+        parser.add_argument('--flush', action='store_true', help='Delete data seeded earlier with the same prefix first.')
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        seeded = User.objects.filter(username__startswith=f'{prefix}-')
+        if options['flush']:
+            Class.objects.filter(teacher__in=seeded).delete()
+            seeded.delete()
+        elif seeded.exists():
+            raise CommandError(f'Users prefixed "{prefix}-" already exist; pass --flush to replace them.')
+        if options['class_size'] > options['students']:
+            raise CommandError('--class-size cannot be larger than --students.')
+
+        rng = random.Random(options['random_seed'])
+        self.batch_size = options['batch_size']
+        # Hashing is slow by design, so every seeded user shares one hash
+        password = make_password(options['password'])
+
+        teachers = self.create_users(f'{prefix}-teacher', options['teachers'], password, 'Teacher')
+        students = self.create_users(f'{prefix}-student', options['students'], password, 'Student')
+        habits = {student.pk: student_habits(rng) for student in students}
+        self.stdout.write(f'Created {len(teachers)} teachers and {len(students)} students.')
+
+        today = timezone.now().date()
+        marked = 0
+        for number in range(options['classes']):
+            ended = rng.random() < options['ended']
+            end = today - timedelta(days=rng.randint(30, 240)) if ended else today
+            days = school_days(end, options['days'])
+            size = max(1, min(len(students), round(rng.gauss(options['class_size'], options['class_size'] / 4))))
+            roster = rng.sample(students, size)
+
+            with transaction.atomic():
+                class_instance = Class.objects.create(
+                    name=f'{rng.choice(SUBJECTS)} {number + 1}',
+                    description=f'Seeded class {number + 1}',
+                    teacher=teachers[number % len(teachers)],
+                    start_date=days[0],
+                    end_date=end if ended else end + timedelta(days=rng.randint(14, 90)),
+                )
+                Class.students.through.objects.bulk_create([
+                    Class.students.through(class_id=class_instance.pk, user_id=student.pk) for student in roster
+                ], batch_size=self.batch_size)
+                marked += self.bulk_insert(Attendance, (
+                    Attendance(student_id=student.pk, classid_id=class_instance.pk, date=day,
+                               status=mark(rng, habits[student.pk], day))
+                    for day in days
+                    for student in roster
+                ))
+
+                if not ended and options['pending']:
+                    # Sample enough students that the wanted number remain once enrolled ones are dropped
+                    wanted = round(rng.expovariate(1 / options['pending']))
+                    enrolled = {student.pk for student in roster}
+                    candidates = rng.sample(students, min(len(students), wanted + size))
+                    JoinRequest.objects.bulk_create([
+                        JoinRequest(student=student, classid=class_instance)
+                        for student in islice((s for s in candidates if s.pk not in enrolled), wanted)
+                    ])
+            if (number + 1) % 50 == 0:
+                self.stdout.write(f'  {number + 1} classes, {marked} attendance rows')
+
+        self.stdout.write(f'Created {options["classes"]} classes with {marked} attendance rows.')
+
+        # Seeding bypasses the model signals, so rebuild everything derived from Attendance
+        call_command('attendance_tallies', stdout=StringIO())
+        call_command('rollup_attendance', since=today - timedelta(days=2 * 365), stdout=StringIO())
+        cache.clear()
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded; sign in as {prefix}-teacher-0 or {prefix}-student-0 with password "{options["password"]}".'
+        ))
+
+    def create_users(self, prefix, count, password, role):
+        users = User.objects.bulk_create([
+            User(username=f'{prefix}-{i}', email=f'{prefix}-{i}@example.com', password=password)
+            for i in range(count)
+        ], batch_size=self.batch_size)
+        # bulk_create skips the provisioning signal
+        Profile.objects.bulk_create([Profile(user=user, role=role) for user in users], batch_size=self.batch_size)
+        return users
+
+    def bulk_insert(self, model, rows):
+        written, batch = 0, []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                model.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        model.objects.bulk_create(batch)
+        return written + len(batch)
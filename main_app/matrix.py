@@ -0,0 +1,78 @@
+import numpy as np
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+from .archive import archived_records
+from .models import Attendance, STATUS_CHOICES
+from .replicas import primary_reads
+
+MATRIX_CACHE_SECONDS = 60 * 60
+
+# int8 code stored per cell; 0 means the student has no mark for that date
+STATUS_CODES = {status: code for code, (status, _) in enumerate(STATUS_CHOICES, start=1)}
+CELL_LETTERS = '-' + ''.join(status for status, _ in STATUS_CHOICES)
+
+
+# Pivots a class's attendance into a students x dates int8 grid from one ordered query
+def build_matrix(class_instance):
+    students = list(class_instance.students.order_by('username').values_list('pk', 'username'))
+    if class_instance.archived_at:
+        rows = [(record.student_id, record.date, record.status) for record in archived_records(class_instance)]
+    else:
+        rows = list(
+            Attendance.objects.filter(classid=class_instance)
+            .order_by('date')
+            .values_list('student_id', 'date', 'status')
+        )
+
+    student_ids = np.array([pk for pk, _ in students], dtype=np.int64)
+    codes = np.zeros((len(students), 0), dtype=np.int8)
+    dates = []
+
+    if rows and len(students):
+        row_students = np.fromiter((student_id for student_id, _, _ in rows), dtype=np.int64, count=len(rows))
+        row_codes = np.fromiter((STATUS_CODES.get(status, 0) for _, _, status in rows), dtype=np.int8, count=len(rows))
+        dates, date_index = np.unique(np.array([day for _, day, _ in rows], dtype='datetime64[D]'), return_inverse=True)
+
+        order = np.argsort(student_ids)
+        position = np.searchsorted(student_ids, row_students, sorter=order)
+        position = np.clip(position, 0, len(student_ids) - 1)
+        enrolled = student_ids[order][position] == row_students
+
+        codes = np.zeros((len(students), len(dates)), dtype=np.int8)
+        codes[order[position[enrolled]], date_index[enrolled]] = row_codes[enrolled]
+        dates = dates.astype(object).tolist()
+
+    return {
+        'students': students,
+        'dates': dates,
+        'codes': codes,
+    }
+
+
+# Returns the class matrix for a class version, rebuilt only after the version changes
+def attendance_matrix(class_instance, version):
+    key = f'attendance-matrix:{class_instance.pk}:{version}'
+    matrix = cache.get(key)
+    if matrix is None:
+        with primary_reads():
+            matrix = build_matrix(class_instance)
+        cache.set(key, matrix, MATRIX_CACHE_SECONDS)
+    return matrix
+
+
+# One (username, cell letters) pair per student, ready for the template
+def matrix_rows(matrix):
+    letters = np.array(list(CELL_LETTERS))
+    return [
+        (username, letters[matrix['codes'][i]].tolist())
+        for i, (_, username) in enumerate(matrix['students'])
+    ]
+
+
+# The dates and rows class_matrix.html renders, loaded only when the template first reads them,
+# so a cached fragment skips the matrix entirely
+def lazy_matrix_table(class_instance, version):
+    def load():
+        matrix = attendance_matrix(class_instance, version)
+        return {'dates': matrix['dates'], 'rows': matrix_rows(matrix)}
+    return SimpleLazyObject(load)
@@ -0,0 +1,98 @@
+import heapq
+import logging
+import time
+from contextlib import ExitStack
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+SLOWEST_SHOWN = 3
+STATEMENT_SHOWN_CHARS = 200
+
+
+# Wraps every SQL statement run on a connection, counting them and keeping the slowest few
+class QueryRecorder:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.slowest = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.seconds += elapsed
+            entry = (elapsed, self.count, sql)
+            if len(self.slowest) < SLOWEST_SHOWN:
+                heapq.heappush(self.slowest, entry)
+            else:
+                heapq.heappushpop(self.slowest, entry)
+
+    # The slowest statements, slowest first, as (milliseconds, sql) pairs
+    def slowest_statements(self):
+        return [(elapsed * 1000, sql[:STATEMENT_SHOWN_CHARS]) for elapsed, _, sql in sorted(self.slowest, reverse=True)]
+
+
+# Records how many queries each view ran and how long they took, as X-Query-Count and X-Query-Time
+# response headers plus a log line listing the slowest statements; views over QUERY_BUDGET_LIMIT are
+# logged as warnings. Only installed while QUERY_BUDGET is on (by default, in DEBUG).
+# Queries run while a streamed response is being sent are not counted.
+class QueryBudgetMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_BUDGET', settings.DEBUG):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.limit = getattr(settings, 'QUERY_BUDGET_LIMIT', None)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        with self.recording(recorder):
+            response = self.get_response(request)
+        return self.report(request, response, recorder)
+
+    # Under ASGI the ORM runs on the request's thread-sensitive worker thread, whose connections are
+    # not the event loop's, so the recorder is attached to them from that thread
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        stack = await sync_to_async(self.recording)(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.report(request, response, recorder)
+
+    def recording(self, recorder):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        return stack
+
+    def report(self, request, response, recorder):
+        sql_ms = recorder.seconds * 1000
+        response['X-Query-Count'] = recorder.count
+        response['X-Query-Time'] = f'{sql_ms:.1f}ms'
+
+        match = request.resolver_match
+        view = match.view_name if match else request.path
+        over_budget = self.limit is not None and recorder.count > self.limit
+        logger.log(
+            logging.WARNING if over_budget else logging.INFO,
+            '%s %s view=%s status=%s queries=%d sql=%.1fms%s',
+            request.method, request.path, view, response.status_code, recorder.count, sql_ms,
+            ''.join(f'\n  {ms:.1f}ms {sql}' for ms, sql in recorder.slowest_statements()),
+        )
+        return response
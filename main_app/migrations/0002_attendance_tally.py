@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+TALLY_FIELDS = {'P': 'present', 'A': 'absent', 'L': 'late', 'E': 'excused'}
+BATCH_SIZE = 1000
+
+
+# Counts the existing attendance history into the new tallies, as manage.py attendance_tallies does
+def backfill_tallies(apps, schema_editor):
+    Attendance = apps.get_model('main_app', 'Attendance')
+    AttendanceTally = apps.get_model('main_app', 'AttendanceTally')
+
+    counts = Attendance.objects.values('student', 'classid').annotate(**{
+        field: Count('id', filter=Q(status=status)) for status, field in TALLY_FIELDS.items()
+    }).order_by()
+    batch = []
+    for row in counts.iterator(chunk_size=BATCH_SIZE):
+        batch.append(AttendanceTally(
+            student_id=row['student'], classid_id=row['classid'],
+            **{field: row[field] for field in TALLY_FIELDS.values()},
+        ))
+        if len(batch) >= BATCH_SIZE:
+            AttendanceTally.objects.bulk_create(batch)
+            batch = []
+    AttendanceTally.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceTally',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('present', models.IntegerField(default=0)),
+                ('absent', models.IntegerField(default=0)),
+                ('late', models.IntegerField(default=0)),
+                ('excused', models.IntegerField(default=0)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_tallies', to=settings.AUTH_USER_MODEL)),
+                ('classid', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_tallies', to='main_app.class')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('student', 'classid'), name='unique_tally_per_student_class')],
+            },
+        ),
+        migrations.RunPython(backfill_tallies, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:17
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Q
+
+TALLY_FIELDS = {'P': 'present', 'A': 'absent', 'L': 'late', 'E': 'excused'}
+
+
+# Keeps the most recent row of every duplicated (student, class, date) and recounts the affected tallies
+def dedupe_attendance(apps, schema_editor):
+    Attendance = apps.get_model('main_app', 'Attendance')
+    AttendanceTally = apps.get_model('main_app', 'AttendanceTally')
+
+    duplicates = (
+        Attendance.objects.values('student', 'classid', 'date')
+        .annotate(rows=Count('id'), keep=Max('id'))
+        .filter(rows__gt=1)
+        .order_by()
+    )
+    affected = set()
+    for group in duplicates.iterator():
+        Attendance.objects.filter(
+            student=group['student'], classid=group['classid'], date=group['date']
+        ).exclude(pk=group['keep']).delete()
+        affected.add((group['student'], group['classid']))
+
+    for student_id, class_id in affected:
+        counts = Attendance.objects.filter(student_id=student_id, classid_id=class_id).aggregate(**{
+            field: Count('id', filter=Q(status=status)) for status, field in TALLY_FIELDS.items()
+        })
+        AttendanceTally.objects.update_or_create(student_id=student_id, classid_id=class_id, defaults=counts)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0002_attendance_tally'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['classid', 'date'], name='attendance_class_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['student', 'classid', 'status'], name='attendance_student_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['student', 'date'], name='attendance_student_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(condition=models.Q(('status__in', ['A', 'L'])), fields=['classid', 'student'], name='attendance_missed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='joinrequest',
+            index=models.Index(fields=['classid', 'status'], name='joinrequest_class_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='joinrequest',
+            index=models.Index(fields=['student', 'status'], name='joinrequest_student_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='joinrequest',
+            index=models.Index(condition=models.Q(('status', 'Pending')), fields=['classid', 'created_at'], name='joinrequest_pending_idx'),
+        ),
+        migrations.RunPython(dedupe_attendance, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='attendance',
+            constraint=models.UniqueConstraint(fields=('student', 'classid', 'date'), name='unique_attendance_per_day'),
+        ),
+    ]
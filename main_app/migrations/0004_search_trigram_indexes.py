@@ -0,0 +1,37 @@
+from django.db import migrations
+
+TRIGRAM_INDEXES = [
+    ('main_app_class_name_trgm_idx', 'main_app_class', 'name'),
+    ('auth_user_username_trgm_idx', 'auth_user', 'username'),
+]
+
+
+# icontains compiles to UPPER(column) LIKE UPPER(%s) on PostgreSQL, which a trigram GIN index
+# on UPPER(column) can serve; other databases keep the plain scan
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for index, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {index} ON {table} USING gin (UPPER({column}) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for index, _, _ in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {index}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0003_attendance_indexes'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0004_search_trigram_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAttendanceRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('present', models.IntegerField(default=0)),
+                ('absent', models.IntegerField(default=0)),
+                ('late', models.IntegerField(default=0)),
+                ('excused', models.IntegerField(default=0)),
+                ('date', models.DateField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RollupState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('watermark', models.DateTimeField(blank=True, null=True)),
+                ('run_until', models.DateTimeField(blank=True, null=True)),
+                ('run_since', models.DateField(blank=True, null=True)),
+                ('cursor', models.CharField(blank=True, max_length=50)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TermAttendanceRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('present', models.IntegerField(default=0)),
+                ('absent', models.IntegerField(default=0)),
+                ('late', models.IntegerField(default=0)),
+                ('excused', models.IntegerField(default=0)),
+                ('term_start', models.DateField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='attendance',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['updated_at'], name='attendance_updated_idx'),
+        ),
+        migrations.AddField(
+            model_name='dailyattendancerollup',
+            name='classid',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='main_app.class'),
+        ),
+        migrations.AddField(
+            model_name='termattendancerollup',
+            name='classid',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='term_rollups', to='main_app.class'),
+        ),
+        migrations.AddField(
+            model_name='termattendancerollup',
+            name='student',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='term_rollups', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyattendancerollup',
+            constraint=models.UniqueConstraint(fields=('classid', 'date'), name='unique_daily_rollup_per_class'),
+        ),
+        migrations.AddIndex(
+            model_name='termattendancerollup',
+            index=models.Index(fields=['classid', 'term_start'], name='term_rollup_class_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='termattendancerollup',
+            constraint=models.UniqueConstraint(fields=('student', 'classid', 'term_start'), name='unique_term_rollup_per_student'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:41
+
+from collections import defaultdict
+from django.db import migrations, models
+
+LATES_PER_ABSENCE = 4
+ABSENCE_WARNING_PCT = 25
+LATE_WARNING_COUNT = 3
+LATE_REMOVAL_COUNT = 5
+
+
+# Sets the new standing flags from the existing tallies
+def compute_standing(apps, schema_editor):
+    AttendanceTally = apps.get_model('main_app', 'AttendanceTally')
+    Profile = apps.get_model('main_app', 'Profile')
+
+    totals = defaultdict(lambda: [False, 0, 0])
+    for student_id, present, absent, late, excused in AttendanceTally.objects.values_list(
+        'student', 'present', 'absent', 'late', 'excused'
+    ).iterator():
+        standing = totals[student_id]
+        standing[0] |= LATE_WARNING_COUNT <= late < LATE_REMOVAL_COUNT
+        standing[1] += absent + late // LATES_PER_ABSENCE
+        standing[2] += present + absent + late + excused
+
+    for student_id, (late_warning, adjusted, total) in totals.items():
+        Profile.objects.filter(user_id=student_id).update(
+            late_warning=late_warning,
+            absence_warning=bool(total) and adjusted * 100 / total > ABSENCE_WARNING_PCT,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0006_job_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='absence_warning',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='late_warning',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='removal_notice',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.RunPython(compute_standing, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,11 @@
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.dispatch import receiver
+from django.utils import timezone
+from .caching import bump_class_version, bump_user_version, bump_catalog_version
+from .rules import absence_percentage
+from .images import variant_url
 
 ROLE_CHOICES = [
     ('Teacher', 'Teacher'),
@@ -15,16 +19,40 @@ STATUS_CHOICES = [
     ('E', 'Excused'),
 ]
 
+# Maps each attendance status to its counter on AttendanceTally
+TALLY_FIELDS = {
+    'P': 'present',
+    'A': 'absent',
+    'L': 'late',
+    'E': 'excused',
+}
+
 # Profile model to extend the User model with additional fields
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='Student')
     bio = models.TextField(blank=True)
     profile_img = models.ImageField(upload_to='profile_images/', blank=True, default='some_default.jpg')
+    # Standing flags kept up to date by every attendance write, so nav.html can show them without counting
+    late_warning = models.BooleanField(default=False)
+    absence_warning = models.BooleanField(default=False)
+    removal_notice = models.CharField(max_length=255, blank=True)
+    # Set once the square variants of profile_img have been written
+    image_variants_ready = models.BooleanField(default=False, editable=False)
 
     def __str__(self):
         return self.user.username
     
+    # Small square avatar, e.g. next to a name in a list
+    @property
+    def thumbnail_url(self):
+        return variant_url(self.profile_img, 64, self.image_variants_ready)
+
+    # Larger square picture for the profile pages
+    @property
+    def avatar_url(self):
+        return variant_url(self.profile_img, 256, self.image_variants_ready)
+
     def completion_percentage(self):
         fields = [self.bio, self.profile_img]
         filled = sum(1 for field in fields if field)
@@ -37,23 +65,11 @@ class Profile(models.Model):
         return []
 
 
-# Automatically create or update Profile when a User is saved
-@receiver(post_save, sender=User)
-def create_profile(sender, instance, created, **kwargs):
-    if created:
-        Profile.objects.create(user=instance)
-
-@receiver(post_save, sender=User)
-def save_profile(sender, instance, **kwargs):
-    if hasattr(instance, 'profile'):
-        instance.profile.save()
-
+# Gives every new User a Profile; later User saves (such as the last_login update) never touch it
 @receiver(post_save, sender=User)
-def create_or_update_user_profile(sender, instance, created, **kwargs):
-    if created:
-        Profile.objects.create(user=instance)
-    else:
-        instance.profile.save()
+def provision_profile(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Profile.objects.get_or_create(user=instance)
 
 # Class model for courses with teacher and student associations
 class Class(models.Model):
@@ -63,10 +79,37 @@ class Class(models.Model):
     end_date = models.DateField(null=True, blank=True)
     teacher = models.ForeignKey(User, on_delete=models.CASCADE, related_name='taught_classes')
     students = models.ManyToManyField(User, related_name='enrolled_classes', blank=True)
+    # Set once the archive_attendance command has moved the class's attendance out of the live table
+    archived_at = models.DateTimeField(null=True, blank=True, editable=False)
 
     def __str__(self):
         return self.name
 
+# Invalidates the cached class pages and lists whenever a class is created, edited or deleted
+@receiver(post_save, sender=Class)
+@receiver(post_delete, sender=Class)
+def class_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    bump_class_version(instance.pk)
+    bump_user_version(instance.teacher_id)
+    bump_catalog_version()
+
+# Invalidates the cached pages of the class and of every student whose enrollment changes
+@receiver(m2m_changed, sender=Class.students.through)
+def class_enrollment_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        # A clear does not report which rows it removes, so look them up before they go
+        related = instance.enrolled_classes if reverse else instance.students
+        pk_set = set(related.values_list('pk', flat=True))
+    elif action not in ('post_add', 'post_remove'):
+        return
+    class_ids, student_ids = (pk_set, [instance.pk]) if reverse else ([instance.pk], pk_set)
+    for class_id in class_ids:
+        bump_class_version(class_id)
+    for student_id in student_ids:
+        bump_user_version(student_id)
+
 # Attendance model to track student attendance in classes
 class Attendance(models.Model):
     student = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -74,10 +117,99 @@ class Attendance(models.Model):
     date = models.DateField()
     status = models.CharField(max_length=1, choices=STATUS_CHOICES)
     reason = models.TextField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'classid', 'date'], name='unique_attendance_per_day'),
+        ]
+        indexes = [
+            models.Index(fields=['classid', 'date'], name='attendance_class_date_idx'),
+            models.Index(fields=['student', 'classid', 'status'], name='attendance_student_status_idx'),
+            models.Index(fields=['student', 'date'], name='attendance_student_date_idx'),
+            models.Index(
+                fields=['classid', 'student'], condition=models.Q(status__in=['A', 'L']),
+                name='attendance_missed_idx',
+            ),
+            models.Index(fields=['updated_at'], name='attendance_updated_idx'),
+        ]
 
     def __str__(self):
         return f"{self.student.username} - {self.classid.name} on {self.date} ({self.get_status_display()})"
 
+# One counter per attendance status, shared by the tally and rollup tables
+class StatusCounts(models.Model):
+    present = models.IntegerField(default=0)
+    absent = models.IntegerField(default=0)
+    late = models.IntegerField(default=0)
+    excused = models.IntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def total(self):
+        return self.present + self.absent + self.late + self.excused
+
+    @property
+    def absence_percentage(self):
+        return round(absence_percentage(self.absent, self.late, self.total), 2)
+
+# Running status counts per student per class, kept in step with every Attendance write
+class AttendanceTally(StatusCounts):
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='attendance_tallies')
+    classid = models.ForeignKey(Class, on_delete=models.CASCADE, related_name='attendance_tallies')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'classid'], name='unique_tally_per_student_class'),
+        ]
+
+    def __str__(self):
+        return f"{self.student.username} - {self.classid.name} ({self.total} marked)"
+
+# Status counts for a whole class on one day, rebuilt by the rollup_attendance command
+class DailyAttendanceRollup(StatusCounts):
+    classid = models.ForeignKey(Class, on_delete=models.CASCADE, related_name='daily_rollups')
+    date = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['classid', 'date'], name='unique_daily_rollup_per_class'),
+        ]
+
+    def __str__(self):
+        return f"{self.classid.name} on {self.date} ({self.total} marked)"
+
+# Status counts for one student in one class over a term, rebuilt by the rollup_attendance command
+class TermAttendanceRollup(StatusCounts):
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='term_rollups')
+    classid = models.ForeignKey(Class, on_delete=models.CASCADE, related_name='term_rollups')
+    term_start = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'classid', 'term_start'], name='unique_term_rollup_per_student'),
+        ]
+        indexes = [
+            models.Index(fields=['classid', 'term_start'], name='term_rollup_class_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.student.username} - {self.classid.name} from {self.term_start} ({self.total} marked)"
+
+# Progress of the rollup_attendance command: the change watermark of the last finished run,
+# and the bounds and position of an interrupted one so it can resume
+class RollupState(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    watermark = models.DateTimeField(null=True, blank=True)
+    run_until = models.DateTimeField(null=True, blank=True)
+    run_since = models.DateField(null=True, blank=True)
+    cursor = models.CharField(max_length=50, blank=True)
+
+    def __str__(self):
+        return f"{self.name} (up to {self.watermark})"
+
 # Model to handle join requests for classes
 class JoinRequest(models.Model):
     student = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -89,5 +221,53 @@ class JoinRequest(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['classid', 'status'], name='joinrequest_class_status_idx'),
+            models.Index(fields=['student', 'status'], name='joinrequest_student_status_idx'),
+            models.Index(
+                fields=['classid', 'created_at'], condition=models.Q(status='Pending'),
+                name='joinrequest_pending_idx',
+            ),
+        ]
+
     def __str__(self):
         return f"{self.student.username} -> {self.classid.name} ({self.status})"
+
+# Join requests decide the student's pending and joined classes, so they invalidate both sides
+@receiver(post_save, sender=JoinRequest)
+@receiver(post_delete, sender=JoinRequest)
+def join_request_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    bump_class_version(instance.classid_id)
+    bump_user_version(instance.student_id)
+
+JOB_STATUS_CHOICES = [
+    ('Pending', 'Pending'),
+    ('Running', 'Running'),
+    ('Done', 'Done'),
+    ('Dead', 'Dead'),
+]
+
+# A unit of background work for the run_jobs worker; failures are retried with backoff
+# until max_attempts, after which the job is parked as Dead with its last error
+class Job(models.Model):
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=JOB_STATUS_CHOICES, default='Pending')
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status}, {self.attempts}/{self.max_attempts} attempts)"
@@ -0,0 +1,71 @@
+from bisect import bisect_left, bisect_right
+from datetime import date
+from django.db.models import Q
+
+
+# Encodes a row's (date, id) position as an opaque cursor for the query string
+def encode_cursor(record):
+    return f"{record.date.isoformat()}.{record.pk}"
+
+
+# Parses a cursor back into (date, id); invalid cursors are treated as absent
+def decode_cursor(cursor):
+    try:
+        day, pk = cursor.split('.')
+        return date.fromisoformat(day), int(pk)
+    except (AttributeError, ValueError):
+        return None
+
+
+# Returns one page of a queryset ordered newest first on (date, id), using keyset pagination
+# so the cost of a page does not grow with how deep into the history it is
+def keyset_page(queryset, per_page, after=None, before=None):
+    after, before = decode_cursor(after), decode_cursor(before)
+
+    if before:
+        day, pk = before
+        rows = list(
+            queryset.filter(Q(date__gt=day) | Q(date=day, pk__gt=pk))
+            .order_by('date', 'pk')[:per_page + 1]
+        )
+        has_previous = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        has_next = True
+    else:
+        if after:
+            day, pk = after
+            queryset = queryset.filter(Q(date__lt=day) | Q(date=day, pk__lt=pk))
+        rows = list(queryset.order_by('-date', '-pk')[:per_page + 1])
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        has_previous = after is not None
+
+    return {
+        'object_list': rows,
+        'next_cursor': encode_cursor(rows[-1]) if rows and has_next else None,
+        'previous_cursor': encode_cursor(rows[0]) if rows and has_previous else None,
+    }
+
+
+# keyset_page for a list already ordered oldest first on (date, id), such as archived records;
+# it takes and returns the same cursors
+def keyset_list_page(records, per_page, after=None, before=None):
+    keys = [(record.date, record.pk) for record in records]
+    after, before = decode_cursor(after), decode_cursor(before)
+
+    if before:
+        start = bisect_right(keys, before)
+        rows = records[start:start + per_page][::-1]
+        has_previous = start + per_page < len(records)
+        has_next = True
+    else:
+        end = bisect_left(keys, after) if after else len(records)
+        rows = records[max(0, end - per_page):end][::-1]
+        has_next = end > per_page
+        has_previous = after is not None
+
+    return {
+        'object_list': rows,
+        'next_cursor': encode_cursor(rows[-1]) if rows and has_next else None,
+        'previous_cursor': encode_cursor(rows[0]) if rows and has_previous else None,
+    }
@@ -0,0 +1,134 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.decorators import sync_and_async_middleware
+
+# Cookie that keeps a browser on the primary for a while after it wrote, so it reads its own writes
+PIN_COOKIE = 'primary_pin'
+
+# Whether reads may go to the replica right now; only set inside replica_reads views
+_use_replica = ContextVar('use_replica', default=False)
+# Per-request routing state, set by replica_pin_middleware
+_request_state = ContextVar('replica_request_state', default=None)
+
+
+class RequestState:
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.wrote = False
+
+
+def replica_alias():
+    alias = getattr(settings, 'REPLICA_DATABASE', None)
+    return alias if alias and alias in settings.DATABASES else None
+
+
+# Reads go to the primary while this request (or a recent one from the same browser) has written,
+# and inside transactions, which must see their own writes
+def primary_required():
+    state = _request_state.get()
+    if state is not None and (state.pinned or state.wrote):
+        return True
+    return connections[DEFAULT_DB_ALIAS].in_atomic_block
+
+
+# Sends reads made inside replica_reads views to the REPLICA_DATABASE alias; everything else,
+# including every write, uses the primary
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and not primary_required():
+            return replica_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state.wrote = True
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        return True
+
+
+@contextmanager
+def replica_allowed(allowed=True):
+    token = _use_replica.set(allowed)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+# Reads whose results are cached under a version key must come from the primary: a lagging replica
+# read just after a version bump would otherwise be cached as current until the next bump
+def primary_reads():
+    return replica_allowed(False)
+
+
+# Reads the rest of a streamed body with the replica allowed, one chunk at a time, so each
+# chunk is read in whatever context the server iterates it from
+def replica_streaming_content(content):
+    iterator = iter(content)
+    while True:
+        with replica_allowed():
+            chunk = next(iterator, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+# Lets a read-only report view read from the replica; put it below the login decorators so the
+# session and user still come from the primary
+def replica_reads(view):
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            with replica_allowed():
+                return await view(request, *args, **kwargs)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with replica_allowed():
+            response = view(request, *args, **kwargs)
+        if response.streaming:
+            response.streaming_content = replica_streaming_content(response.streaming_content)
+        return response
+    return wrapper
+
+
+def start_request(request):
+    return _request_state.set(RequestState(pinned=PIN_COOKIE in request.COOKIES))
+
+
+def finish_request(token, response):
+    state = _request_state.get()
+    _request_state.reset(token)
+    if state.wrote:
+        response.set_cookie(
+            PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax',
+        )
+    return response
+
+
+# Tracks whether a request wrote, and pins the browser to the primary for REPLICA_PIN_SECONDS
+# afterwards (longer than the replica is expected to lag); only installed when a replica is configured
+@sync_and_async_middleware
+def replica_pin_middleware(get_response):
+    if replica_alias() is None:
+        raise MiddlewareNotUsed
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            token = start_request(request)
+            return finish_request(token, await get_response(request))
+    else:
+        def middleware(request):
+            token = start_request(request)
+            return finish_request(token, get_response(request))
+    return middleware
@@ -0,0 +1,132 @@
+from collections import defaultdict
+from datetime import date, timedelta
+from django.db.models import Count, F, Q, Sum
+from .models import (
+    Attendance, AttendanceTally, DailyAttendanceRollup, TermAttendanceRollup, RollupState, TALLY_FIELDS)
+from . import rules
+
+ROLLUP_STATE = 'attendance'
+# Months in which a term begins; each term runs until the day before the next one starts
+TERM_START_MONTHS = (1, 5, 9)
+# Writes stamped shortly before a run starts may not be committed yet, so each run stops this far behind
+SETTLE_TIME = timedelta(minutes=5)
+# Each incremental run also rechecks the days changed this long before the watermark, so marks from
+# transactions that committed later than SETTLE_TIME after their timestamp are still rolled up
+RECHECK_WINDOW = timedelta(hours=1)
+
+STATUS_COUNTS = {field: Count('pk', filter=Q(status=status)) for status, field in TALLY_FIELDS.items()}
+
+
+def term_start(day):
+    month = max(month for month in TERM_START_MONTHS if month <= day.month)
+    return date(day.year, month, 1)
+
+
+def term_end(start):
+    later = [month for month in TERM_START_MONTHS if month > start.month]
+    if later:
+        return date(start.year, later[0], 1) - timedelta(days=1)
+    return date(start.year + 1, TERM_START_MONTHS[0], 1) - timedelta(days=1)
+
+
+# Classes whose daily rollups count more marks than their tallies: some of their attendance was deleted
+# (with a student, or by hand), which leaves no updated_at behind. Tallies are kept in the writing
+# transaction, so they follow deletes at once; archived classes have no live rows and are skipped
+def classes_with_deletions():
+    marks = Sum(sum((F(field) for field in TALLY_FIELDS.values()), start=0))
+    rolled = (
+        DailyAttendanceRollup.objects.filter(classid__archived_at__isnull=True)
+        .values('classid').annotate(marks=marks).values_list('classid', 'marks').order_by()
+    )
+    live = dict(
+        AttendanceTally.objects.filter(classid__archived_at__isnull=True)
+        .values('classid').annotate(marks=marks).values_list('classid', 'marks').order_by()
+    )
+    return [class_id for class_id, total in rolled if total > live.get(class_id, 0)]
+
+
+# Finds the (class, day) pairs to roll up and groups them into units of work keyed (class id, term start):
+# with `since`, every day from that date on; otherwise the days whose marks changed after the watermark
+# (less RECHECK_WINDOW) plus every rolled-up day of the classes that lost attendance
+def changed_units(watermark=None, until=None, since=None):
+    marks = Attendance.objects.all()
+    if since:
+        marks = marks.filter(date__gte=since)
+    else:
+        if watermark:
+            marks = marks.filter(updated_at__gt=watermark - RECHECK_WINDOW)
+        if until:
+            marks = marks.filter(updated_at__lte=until)
+    pairs = marks.order_by().values_list('classid', 'date').distinct()
+    if since:
+        # Days already rolled up whose attendance has since gone must be cleared as well, except in
+        # archived classes, whose attendance left the live table on purpose
+        pairs = pairs.union(
+            DailyAttendanceRollup.objects.filter(date__gte=since, classid__archived_at__isnull=True)
+            .order_by().values_list('classid', 'date')
+        )
+    elif watermark:
+        pairs = pairs.union(
+            DailyAttendanceRollup.objects.filter(classid__in=classes_with_deletions())
+            .order_by().values_list('classid', 'date')
+        )
+
+    units = defaultdict(set)
+    for class_id, day in pairs.iterator():
+        units[(class_id, term_start(day))].add(day)
+    return sorted(units.items())
+
+
+# Recomputes one class's daily rollups for the given days and its per-student rollups for the whole term
+# Must run inside a transaction
+def refresh_unit(class_id, start, days):
+    DailyAttendanceRollup.objects.filter(classid_id=class_id, date__in=days).delete()
+    daily = (
+        Attendance.objects.filter(classid_id=class_id, date__in=days)
+        .values('date').annotate(**STATUS_COUNTS).order_by()
+    )
+    DailyAttendanceRollup.objects.bulk_create([
+        DailyAttendanceRollup(classid_id=class_id, **row) for row in daily
+    ])
+
+    TermAttendanceRollup.objects.filter(classid_id=class_id, term_start=start).delete()
+    term = (
+        Attendance.objects.filter(classid_id=class_id, date__range=(start, term_end(start)))
+        .values('student').annotate(**STATUS_COUNTS).order_by()
+    )
+    TermAttendanceRollup.objects.bulk_create([
+        TermAttendanceRollup(classid_id=class_id, term_start=start, student_id=row.pop('student'), **row)
+        for row in term
+    ])
+
+
+# When the rollups were last brought up to date, or None if they never were
+def rolled_up_until():
+    return RollupState.objects.filter(name=ROLLUP_STATE).values_list('watermark', flat=True).first()
+
+
+# Per-class, per-term totals with the number of at-risk students, newest term first
+def term_summaries(classes):
+    summaries = {}
+    rollups = (
+        TermAttendanceRollup.objects.filter(classid__in=classes)
+        .values_list('classid', 'classid__name', 'term_start', *TALLY_FIELDS.values())
+    )
+    for class_id, class_name, start, present, absent, late, excused in rollups.iterator():
+        summary = summaries.setdefault((class_id, start), {
+            'class_id': class_id, 'class_name': class_name,
+            'term_start': start, 'term_end': term_end(start),
+            'students': 0, 'at_risk': 0, 'present': 0, 'absent': 0, 'late': 0, 'excused': 0,
+        })
+        total = present + absent + late + excused
+        summary['students'] += 1
+        summary['at_risk'] += rules.is_absence_warning(rules.absence_percentage(absent, late, total))
+        summary['present'] += present
+        summary['absent'] += absent
+        summary['late'] += late
+        summary['excused'] += excused
+
+    for summary in summaries.values():
+        total = summary['present'] + summary['absent'] + summary['late'] + summary['excused']
+        summary['attendance_rate'] = round(rules.attendance_rate(summary['absent'], summary['late'], total), 2)
+    return sorted(summaries.values(), key=lambda summary: (-summary['term_start'].toordinal(), summary['class_name']))
@@ -0,0 +1,77 @@
+import csv
+import io
+import re
+from django.contrib.auth.models import User
+from django.db import transaction
+from .caching import bump_class_version, bump_user_version
+from .models import JoinRequest
+
+USERNAME_SEPARATORS = re.compile(r'[\s,;]+')
+
+
+# Pulls usernames out of a pasted list and/or the first column of an uploaded CSV, keeping order
+def parse_usernames(pasted='', upload=None):
+    names = USERNAME_SEPARATORS.split(pasted.strip()) if pasted else []
+    if upload is not None:
+        text = io.TextIOWrapper(upload.file, encoding='utf-8-sig')
+        for row in csv.reader(text):
+            if row and row[0].strip() and row[0].strip().lower() != 'username':
+                names.append(row[0].strip())
+    return list(dict.fromkeys(name for name in names if name))
+
+
+# Sorts the requested usernames into students to add, unknown names, non-students and existing members
+def resolve_roster(class_instance, usernames):
+    users = {
+        user.username: user
+        for user in User.objects.filter(username__in=usernames).select_related('profile')
+    }
+    enrolled = set(
+        class_instance.students.filter(username__in=usernames).values_list('username', flat=True)
+    )
+
+    preview = {'to_add': [], 'unknown': [], 'not_students': [], 'already_enrolled': []}
+    for name in usernames:
+        user = users.get(name)
+        if user is None:
+            preview['unknown'].append(name)
+        elif user.profile.role != 'Student':
+            preview['not_students'].append(name)
+        elif name in enrolled:
+            preview['already_enrolled'].append(name)
+        else:
+            preview['to_add'].append(user)
+    return preview
+
+
+# Enrolls a batch of students with a single M2M insert
+def enroll_students(class_instance, students):
+    with transaction.atomic():
+        class_instance.students.add(*students)
+
+
+JOIN_DECISIONS = {'approve': 'Approved', 'reject': 'Rejected'}
+
+
+# Approves or rejects pending join requests of one class in a single transaction: one UPDATE for the
+# statuses and one bulk insert for the approved enrollments. request_ids=None decides every pending request;
+# ids belonging to other classes or already decided are ignored. Returns the ids of the deciding students.
+def decide_join_requests(class_instance, action, request_ids=None):
+    status = JOIN_DECISIONS[action]
+    with transaction.atomic():
+        pending = JoinRequest.objects.select_for_update().filter(classid=class_instance, status='Pending')
+        if request_ids is not None:
+            pending = pending.filter(pk__in=request_ids)
+        decided = dict(pending.values_list('pk', 'student_id'))
+        if not decided:
+            return []
+
+        JoinRequest.objects.filter(pk__in=decided).update(status=status)
+        if status == 'Approved':
+            class_instance.students.add(*decided.values())
+
+        # update() skips the post_save receiver that normally invalidates these pages
+        bump_class_version(class_instance.pk)
+        for student_id in decided.values():
+            bump_user_version(student_id)
+    return list(decided.values())
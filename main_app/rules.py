@@ -0,0 +1,37 @@
+# Attendance rule definitions shared by the views, the roll-call write path and the analytics engine
+# The functions only use arithmetic, so they work on plain ints and on NumPy arrays alike
+
+# Every this many lates count as one absence
+LATES_PER_ABSENCE = 4
+# Absence percentage above which a student is warned / flagged at risk
+ABSENCE_WARNING_PCT = 25
+# Late count that triggers a lateness warning, and the count that removes the student from the class
+LATE_WARNING_COUNT = 3
+LATE_REMOVAL_COUNT = 5
+# Number of most recent sessions used for the rolling trend
+TREND_WINDOW = 10
+
+
+def lateness_adjusted_absences(absent, late):
+    return absent + late // LATES_PER_ABSENCE
+
+
+# Lateness-adjusted absences as a percentage of marked sessions (0 when nothing is marked)
+def absence_percentage(absent, late, total):
+    adjusted = lateness_adjusted_absences(absent, late) * 100
+    if isinstance(total, int):
+        return adjusted / total if total else 0
+    return adjusted / (total + (total == 0)) * (total > 0)
+
+
+def attendance_rate(absent, late, total):
+    return 100 - absence_percentage(absent, late, total)
+
+
+def is_absence_warning(absence_pct):
+    return absence_pct > ABSENCE_WARNING_PCT
+
+
+# Warned about lateness in a class, but not yet removed from it; works on counts and NumPy arrays
+def is_late_warning(late):
+    return (late >= LATE_WARNING_COUNT) & (late < LATE_REMOVAL_COUNT)
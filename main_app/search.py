@@ -0,0 +1,93 @@
+import hashlib
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import Case, IntegerField, Value, When
+from .caching import VERSIONED_CACHE_SECONDS, catalog_version
+from .models import Class
+from .replicas import primary_reads
+
+SEARCH_PAGE_SIZE = 20
+TYPEAHEAD_LIMIT = 10
+TYPEAHEAD_MIN_LENGTH = 2
+TYPEAHEAD_CACHE_SECONDS = 60
+
+
+# Ranks prefix matches ahead of substring matches, then alphabetically
+# On PostgreSQL the icontains filter is served by the trigram indexes from migration 0004_search_trigram_indexes
+def ranked_matches(queryset, field, query):
+    return (
+        queryset.filter(**{f'{field}__icontains': query})
+        .annotate(prefix_rank=Case(
+            When(**{f'{field}__istartswith': query}, then=Value(0)),
+            default=Value(1),
+            output_field=IntegerField(),
+        ))
+        .order_by('prefix_rank', field, 'pk')
+    )
+
+
+# Classes whose name matches the query; every class when the query is empty
+def find_classes(query):
+    if not query:
+        return Class.objects.order_by('name', 'pk')
+    return ranked_matches(Class.objects.all(), 'name', query)
+
+
+# One page of class search results; the match count and each page are cached until any class changes
+def class_search_page(query, number):
+    paginator = Paginator(find_classes(query), SEARCH_PAGE_SIZE)
+    prefix = f'class-search:{catalog_version()}:{hashlib.md5(query.lower().encode()).hexdigest()}'
+
+    count = cache.get(f'{prefix}:count')
+    if count is None:
+        with primary_reads():
+            count = paginator.count
+        cache.set(f'{prefix}:count', count, VERSIONED_CACHE_SECONDS)
+    else:
+        paginator.count = count
+
+    page = paginator.get_page(number)
+    classes = cache.get(f'{prefix}:{page.number}')
+    if classes is None:
+        with primary_reads():
+            classes = list(page.object_list)
+        cache.set(f'{prefix}:{page.number}', classes, VERSIONED_CACHE_SECONDS)
+    page.object_list = classes
+    return page
+
+
+# Students whose username matches the query, leaving out anyone already in the class
+def find_students(query, exclude_class=None):
+    students = User.objects.filter(profile__role='Student')
+    if exclude_class is not None:
+        students = students.exclude(enrolled_classes=exclude_class)
+    return ranked_matches(students, 'username', query)
+
+
+# Returns one page of typeahead suggestions, caching each (kind, prefix, page) briefly
+# since the same few prefixes are typed by everyone at the start of term
+def typeahead(kind, query, page=1):
+    query = query.strip()
+    if len(query) < TYPEAHEAD_MIN_LENGTH:
+        return {'results': [], 'has_more': False}
+
+    digest = hashlib.md5(query.lower().encode()).hexdigest()
+    cache_key = f'typeahead:{kind}:{page}:{digest}'
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    if kind == 'students':
+        rows = find_students(query).values_list('pk', 'username')
+    else:
+        rows = find_classes(query).values_list('pk', 'name')
+
+    start = (page - 1) * TYPEAHEAD_LIMIT
+    matches = list(rows[start:start + TYPEAHEAD_LIMIT + 1])
+    result = {
+        'results': [{'id': pk, 'label': label} for pk, label in matches[:TYPEAHEAD_LIMIT]],
+        'has_more': len(matches) > TYPEAHEAD_LIMIT,
+    }
+    cache.set(cache_key, result, TYPEAHEAD_CACHE_SECONDS)
+    return result
@@ -0,0 +1,53 @@
+from django.contrib.auth.models import User
+from django.core.mail import send_mail
+from .attendance import process_attendance_rules
+from .images import delete_image, write_variants
+from .jobs import job, enqueue
+from .models import Class, Profile
+
+
+# Applies the lateness rules after a roll call and queues a notice for every student they affect
+@job('attendance_rules')
+def apply_attendance_rules(class_id, student_ids):
+    class_instance = Class.objects.filter(pk=class_id).first()
+    if class_instance is None:
+        return
+    students = list(User.objects.filter(pk__in=student_ids))
+    warned, removed = process_attendance_rules(class_instance, students)
+    for student in warned:
+        enqueue('lateness_notice', student_id=student.pk, class_id=class_id, removed=False)
+    for student in removed:
+        enqueue('lateness_notice', student_id=student.pk, class_id=class_id, removed=True)
+
+
+# Emails the student and their teacher about a lateness warning or removal
+@job('lateness_notice')
+def send_lateness_notice(student_id, class_id, removed):
+    student = User.objects.filter(pk=student_id).first()
+    class_instance = Class.objects.select_related('teacher').filter(pk=class_id).first()
+    if student is None or class_instance is None:
+        return
+
+    if removed:
+        subject = f"Removed from {class_instance.name}"
+        body = f"{student.username} has been removed from {class_instance.name} due to repeated lateness."
+    else:
+        subject = f"Lateness warning for {class_instance.name}"
+        body = f"{student.username} has received a warning for lateness in {class_instance.name}."
+
+    recipients = [email for email in (student.email, class_instance.teacher.email) if email]
+    if recipients:
+        send_mail(subject, body, None, recipients)
+
+
+# Writes the resized variants of a newly uploaded profile image
+@job('profile_image_variants')
+def generate_profile_image_variants(name):
+    write_variants(name)
+    Profile.objects.filter(profile_img=name).update(image_variants_ready=True)
+
+
+# Removes a replaced profile image and its variants from storage
+@job('delete_profile_image')
+def delete_profile_image(name):
+    delete_image(name)
@@ -1,3 +1,1051 @@
-from django.test import TestCase
+import csv
+import json
+import tempfile
+from datetime import date, timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+import numpy as np
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from PIL import Image
+from django.conf import settings
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.contrib.auth.models import User
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import NotSupportedError, connection
+from django.db.models import Count
+from django.urls import reverse
+from django.utils import timezone
+from .analytics import STATUS_COLUMNS, load_attendance, summarize
+from .attendance import commit_roll_call, save_attendance
+from .caching import class_version_key
+from .exports import attendance_csv_rows
+from .gaps import MissingMarks
+from .images import VARIANT_SIZES, variant_name
+from .jobs import DONE_JOB_RETENTION, HANDLERS, JOB_TIMEOUT, RETRY_BASE_SECONDS, claim_jobs, enqueue, run_job
+from .middleware import QueryBudgetMiddleware
+from .models import Profile, Class, Attendance, AttendanceTally, DailyAttendanceRollup, Job, JoinRequest
+from .pagination import keyset_list_page, keyset_page
+from .replicas import (
+    PIN_COOKIE, ReplicaRouter, finish_request, primary_reads, replica_allowed, start_request)
+from .rollups import rolled_up_until
+from .rules import ABSENCE_WARNING_PCT, LATE_REMOVAL_COUNT, LATE_WARNING_COUNT
+from .search import SEARCH_PAGE_SIZE, TYPEAHEAD_LIMIT
+from .urls import urlpatterns
+from . import tasks  # noqa: F401  (registers the job handlers before tests patch HANDLERS)
 
-# Create your tests here.
+
+class ProfileProvisioningTests(TestCase):
+    def test_signup_creates_one_profile(self):
+        with self.assertNumQueries(14):
+            response = self.client.post(reverse('signup'), {
+                'username': 'newstudent',
+                'email': 'new@example.com',
+                'password': 'a-long-passphrase',
+                'password2': 'a-long-passphrase',
+            })
+        self.assertRedirects(response, reverse('edit_profile'), fetch_redirect_response=False)
+        user = User.objects.get(username='newstudent')
+        self.assertEqual(Profile.objects.filter(user=user).count(), 1)
+        self.assertEqual(user.profile.role, 'Student')
+
+    def test_login_does_not_write_profile(self):
+        User.objects.create_user('returning', password='a-long-passphrase')
+        with self.assertNumQueries(9):
+            response = self.client.post(reverse('login'), {
+                'username': 'returning',
+                'password': 'a-long-passphrase',
+            })
+        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+
+    def test_saving_user_again_is_idempotent(self):
+        user = User.objects.create_user('resaved', password='a-long-passphrase')
+        user.first_name = 'Re'
+        with self.assertNumQueries(1):
+            user.save()
+        self.assertEqual(Profile.objects.filter(user=user).count(), 1)
+
+
+class ProfilePreloadTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('preloaded', password='a-long-passphrase')
+        self.client.force_login(self.user)
+
+    def test_authenticated_page_loads_profile_with_user(self):
+        # One query for the session and one for the user joined to its profile
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('home'))
+        self.assertContains(response, 'My Classes')
+
+    def test_own_profile_detail_reuses_request_profile(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('profile_detail', args=[self.user.pk]))
+        self.assertEqual(response.context['profile'].user, self.user)
+
+
+class AttendanceTallyTests(TestCase):
+    def setUp(self):
+        self.teacher = User.objects.create_user('tallyteacher')
+        self.teacher.profile.role = 'Teacher'
+        self.teacher.profile.save()
+        self.student = User.objects.create_user('tallystudent')
+        self.class_instance = Class.objects.create(name='Tallied', description='', teacher=self.teacher)
+        self.class_instance.students.add(self.student)
+        self.day = date(2026, 3, 2)
+
+    def tally(self):
+        tally = AttendanceTally.objects.get(student=self.student, classid=self.class_instance)
+        return tally.present, tally.absent, tally.late, tally.excused
+
+    def test_new_mark_is_counted(self):
+        commit_roll_call(self.class_instance, [(self.student, 'A', '')], self.day)
+        self.assertEqual(self.tally(), (0, 1, 0, 0))
+
+    def test_status_change_moves_the_count(self):
+        commit_roll_call(self.class_instance, [(self.student, 'A', '')], self.day)
+        save_attendance(self.class_instance, self.student, self.day, 'L')
+        self.assertEqual(self.tally(), (0, 0, 1, 0))
+        self.assertEqual(Attendance.objects.get().status, 'L')
+
+    def test_resubmitting_the_same_roll_call_changes_nothing(self):
+        commit_roll_call(self.class_instance, [(self.student, 'P', '')], self.day)
+        commit_roll_call(self.class_instance, [(self.student, 'P', '')], self.day)
+        commit_roll_call(self.class_instance, [(self.student, 'P', 'on time')], self.day)
+        self.assertEqual(self.tally(), (1, 0, 0, 0))
+        self.assertEqual(Attendance.objects.count(), 1)
+
+    def test_marks_on_other_days_add_up(self):
+        for offset, status in enumerate('PLLE'):
+            commit_roll_call(self.class_instance, [(self.student, status, '')], self.day + timedelta(days=offset))
+        self.assertEqual(self.tally(), (1, 0, 2, 1))
+        call_command('attendance_tallies', verify=True, stdout=StringIO())
+
+    def test_tallies_match_rows_after_roll_call_and_edit(self):
+        other = User.objects.create_user('tallyother')
+        self.class_instance.students.add(other)
+        today = timezone.now().date()
+        self.client.force_login(self.teacher)
+        self.client.post(reverse('class_detail', args=[self.class_instance.pk]), {
+            'TOTAL_FORMS': 2,
+            'form-0-student': self.student.pk, 'form-0-status': 'A', 'form-0-reason': '',
+            'form-1-student': other.pk, 'form-1-status': 'L', 'form-1-reason': '',
+        })
+        self.client.post(reverse('edit_attendance', args=[self.class_instance.pk, self.student.pk]), {
+            'selected_date': today, 'status': 'E', 'reason': 'doctor',
+        })
+        self.client.post(reverse('edit_attendance', args=[self.class_instance.pk, other.pk]), {
+            'selected_date': today - timedelta(days=1), 'status': 'P', 'reason': '',
+        })
+
+        rows = {
+            (row['student'], row['status']): row['n']
+            for row in Attendance.objects.values('student', 'status').annotate(n=Count('pk'))
+        }
+        self.assertEqual(sum(rows.values()), 3)
+        for tally in AttendanceTally.objects.filter(classid=self.class_instance):
+            with self.subTest(student=tally.student_id):
+                self.assertEqual(
+                    (tally.present, tally.absent, tally.late, tally.excused),
+                    tuple(rows.get((tally.student_id, status), 0) for status in 'PALE'),
+                )
+
+    # The first read misses the row, as when another teacher's first submission commits in between
+    def racing_insert(self):
+        select_for_update = Attendance.objects.select_for_update
+        missed = []
+
+        def first_read_misses(*args, **kwargs):
+            if not missed:
+                missed.append(True)
+                return Attendance.objects.none()
+            return select_for_update(*args, **kwargs)
+        return mock.patch.object(Attendance.objects, 'select_for_update', side_effect=first_read_misses)
+
+    def test_concurrent_first_roll_calls_update_instead_of_failing(self):
+        commit_roll_call(self.class_instance, [(self.student, 'A', '')], self.day)
+        with self.racing_insert():
+            commit_roll_call(self.class_instance, [(self.student, 'P', '')], self.day)
+        self.assertEqual(self.tally(), (1, 0, 0, 0))
+        self.assertEqual(Attendance.objects.get().status, 'P')
+
+    def test_concurrent_first_single_marks_update_instead_of_failing(self):
+        save_attendance(self.class_instance, self.student, self.day, 'A')
+        with self.racing_insert():
+            save_attendance(self.class_instance, self.student, self.day, 'E')
+        self.assertEqual(self.tally(), (0, 0, 0, 1))
+
+    def test_edit_attendance_rejects_an_unknown_status(self):
+        self.client.force_login(self.teacher)
+        url = reverse('edit_attendance', args=[self.class_instance.pk, self.student.pk])
+        response = self.client.post(url, {'selected_date': '2026-03-02', 'status': 'X'})
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+        self.assertFalse(Attendance.objects.exists())
+        self.assertFalse(AttendanceTally.objects.exists())
+
+
+class ProfileImageTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+        cache.clear()
+        self.student = User.objects.create_user('pictured')
+        self.client.force_login(self.student)
+
+    def upload(self, name):
+        image = BytesIO()
+        Image.new('RGB', (300, 200), 'teal').save(image, 'PNG')
+        self.client.post(reverse('edit_profile'), {
+            'bio': '', 'profile_img': SimpleUploadedFile(name, image.getvalue(), 'image/png'),
+        })
+        call_command('run_jobs', once=True, stdout=StringIO())
+        return Profile.objects.get(user=self.student)
+
+    def test_variants_are_recorded_and_used_without_asking_storage(self):
+        profile = self.upload('face.png')
+        self.assertTrue(profile.image_variants_ready)
+        with mock.patch.object(default_storage, 'exists') as exists:
+            self.assertEqual(profile.thumbnail_url, default_storage.url(variant_name(profile.profile_img.name, 64)))
+        exists.assert_not_called()
+
+    def test_roster_shows_thumbnails(self):
+        profile = self.upload('face.png')
+        teacher = User.objects.create_user('picturedteacher')
+        class_instance = Class.objects.create(name='Pictured', description='', teacher=teacher)
+        class_instance.students.add(self.student)
+        response = self.client.get(reverse('class_detail', args=[class_instance.pk]))
+        self.assertContains(response, profile.thumbnail_url)
+
+    def test_replacing_the_image_deletes_the_old_files(self):
+        old_name = self.upload('first.png').profile_img.name
+        old_files = [old_name, *(variant_name(old_name, size) for size in VARIANT_SIZES)]
+        self.assertTrue(all(default_storage.exists(name) for name in old_files))
+
+        new_name = self.upload('second.png').profile_img.name
+        self.assertFalse(any(default_storage.exists(name) for name in old_files))
+        self.assertTrue(default_storage.exists(variant_name(new_name, 256)))
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        handlers = mock.patch.dict(HANDLERS, {'ok': mock.Mock(), 'boom': mock.Mock(side_effect=RuntimeError('boom'))})
+        handlers.start()
+        self.addCleanup(handlers.stop)
+
+    def test_claims_only_due_jobs_once(self):
+        due, later = enqueue('ok'), enqueue('ok')
+        Job.objects.filter(pk=later.pk).update(run_after=timezone.now() + timedelta(hours=1))
+
+        claimed = claim_jobs(10)
+        self.assertEqual([job.pk for job in claimed], [due.pk])
+        due.refresh_from_db()
+        self.assertEqual((due.status, due.attempts), ('Running', 1))
+        self.assertEqual(claim_jobs(10), [])
+
+    def test_reclaims_jobs_lost_with_their_worker(self):
+        lost = enqueue('ok')
+        claim_jobs(10)
+        Job.objects.filter(pk=lost.pk).update(locked_at=timezone.now() - JOB_TIMEOUT - timedelta(seconds=1))
+        self.assertEqual([(job.pk, job.attempts) for job in claim_jobs(10)], [(lost.pk, 2)])
+
+    def test_success_marks_done(self):
+        job = enqueue('ok', value=1)
+        self.assertTrue(run_job(claim_jobs(1)[0]))
+        HANDLERS['ok'].assert_called_once_with(value=1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'Done')
+        self.assertIsNotNone(job.finished_at)
+
+    def test_failures_back_off_then_die(self):
+        job = enqueue('boom')
+        Job.objects.filter(pk=job.pk).update(max_attempts=3)
+        delays = []
+        for _ in range(3):
+            Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+            started = timezone.now()
+            with self.assertLogs('main_app.jobs', 'ERROR'):
+                self.assertFalse(run_job(claim_jobs(1)[0]))
+            job.refresh_from_db()
+            delays.append(round((job.run_after - started).total_seconds()))
+
+        self.assertEqual(delays[:2], [RETRY_BASE_SECONDS, RETRY_BASE_SECONDS * 2])
+        self.assertEqual((job.status, job.attempts), ('Dead', 3))
+        self.assertIn('RuntimeError: boom', job.last_error)
+        self.assertEqual(claim_jobs(10), [])
+
+        call_command('run_jobs', requeue_dead=True, stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('Pending', 0))
+        self.assertEqual([claimed.pk for claimed in claim_jobs(10)], [job.pk])
+
+    def test_purges_old_done_jobs(self):
+        old, recent, dead = enqueue('ok'), enqueue('ok'), enqueue('boom')
+        Job.objects.filter(pk__in=[old.pk, recent.pk]).update(status='Done', finished_at=timezone.now())
+        Job.objects.filter(pk=old.pk).update(finished_at=timezone.now() - DONE_JOB_RETENTION - timedelta(days=1))
+        Job.objects.filter(pk=dead.pk).update(status='Dead', finished_at=timezone.now() - timedelta(days=30))
+
+        call_command('run_jobs', once=True, stdout=StringIO())
+        self.assertEqual(set(Job.objects.values_list('pk', flat=True)), {recent.pk, dead.pk})
+
+    def test_roll_call_reports_lateness_before_the_worker_runs(self):
+        teacher = User.objects.create_user('rollteacher')
+        teacher.profile.role = 'Teacher'
+        teacher.profile.save()
+        student = User.objects.create_user('rollstudent')
+        class_instance = Class.objects.create(name='Roll', description='', teacher=teacher)
+        class_instance.students.add(student)
+        for days_ago in (1, 2):
+            commit_roll_call(class_instance, [(student, 'L', '')], date.today() - timedelta(days=days_ago))
+
+        self.client.force_login(teacher)
+        response = self.client.post(reverse('class_detail', args=[class_instance.pk]), {
+            'TOTAL_FORMS': 1, 'form-0-student': student.pk, 'form-0-status': 'L', 'form-0-reason': '',
+        })
+        self.assertIn(
+            'rollstudent has received a warning for lateness.',
+            [message.message for message in get_messages(response.wsgi_request)],
+        )
+        self.assertTrue(class_instance.students.filter(pk=student.pk).exists())
+        self.assertEqual(Job.objects.filter(kind='attendance_rules').count(), 3)
+
+    def test_only_new_late_marks_queue_the_rules(self):
+        teacher = User.objects.create_user('reteacher')
+        student = User.objects.create_user('restudent')
+        class_instance = Class.objects.create(name='Remark', description='', teacher=teacher)
+        class_instance.students.add(student)
+        commit_roll_call(class_instance, [(student, 'L', '')], date.today())
+        warned, removed = commit_roll_call(class_instance, [(student, 'L', 'traffic')], date.today())
+
+        self.assertEqual((warned, removed), ([], []))
+        self.assertEqual(Job.objects.filter(kind='attendance_rules').count(), 1)
+
+    def test_single_late_edit_queues_the_rules(self):
+        teacher = User.objects.create_user('editteacher')
+        student = User.objects.create_user('editstudent')
+        class_instance = Class.objects.create(name='Edit', description='', teacher=teacher)
+        class_instance.students.add(student)
+        for days_ago in range(LATE_REMOVAL_COUNT):
+            save_attendance(class_instance, student, date.today() - timedelta(days=days_ago), 'L')
+        save_attendance(class_instance, student, date.today(), 'L', 'traffic')
+
+        self.assertEqual(Job.objects.filter(kind='attendance_rules').count(), LATE_REMOVAL_COUNT)
+        call_command('run_jobs', once=True, stdout=StringIO())
+        self.assertFalse(class_instance.students.filter(pk=student.pk).exists())
+
+
+class QueryBudgetMiddlewareTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('budgeted'))
+
+    def test_reports_queries_in_headers_and_log(self):
+        with self.assertLogs('main_app.middleware', 'INFO') as logs:
+            response = self.client.get(reverse('home'))
+        self.assertEqual(response['X-Query-Count'], '2')
+        self.assertTrue(response['X-Query-Time'].endswith('ms'))
+        self.assertEqual(logs.records[0].levelname, 'INFO')
+        self.assertIn('view=home status=200 queries=2', logs.output[0])
+
+    @override_settings(QUERY_BUDGET_LIMIT=1)
+    def test_warns_with_slowest_statements_over_budget(self):
+        with self.assertLogs('main_app.middleware', 'WARNING') as logs:
+            self.client.get(reverse('home'))
+        self.assertIn('queries=2', logs.output[0])
+        self.assertIn('FROM "django_session"', logs.output[0])
+
+    async def test_counts_queries_of_async_views_without_leaving_the_event_loop(self):
+        middleware = QueryBudgetMiddleware(mock.AsyncMock(return_value=HttpResponse()))
+        self.assertTrue(iscoroutinefunction(middleware))
+
+        await cache.aclear()
+        sync_response = await sync_to_async(self.client.get)(reverse('view_classes'))
+        await cache.aclear()
+        await self.async_client.aforce_login(await User.objects.aget(username='budgeted'))
+        response = await self.async_client.get(reverse('view_classes'))
+        self.assertEqual(response['X-Query-Count'], sync_response['X-Query-Count'])
+        self.assertEqual(response['X-Query-Count'], '3')
+
+    @override_settings(QUERY_BUDGET=False)
+    def test_not_installed_when_off(self):
+        response = self.client.get(reverse('home'))
+        self.assertNotIn('X-Query-Count', response)
+
+
+# Builds a realistic school: a teacher running a few classes, each with an enrolled roster marked
+# every weekday, with tallies and rollups up to date, plus students waiting on join requests
+def build_school(classes=3, students=30, days=20, pending=5):
+    teacher = User.objects.create_user('teacher', email='teacher@example.com')
+    teacher.profile.role = 'Teacher'
+    teacher.profile.save()
+
+    enrolled = User.objects.bulk_create([
+        User(username=f'student{i:03}', email=f'student{i:03}@example.com') for i in range(students)
+    ])
+    waiting = User.objects.bulk_create([
+        User(username=f'applicant{i:03}') for i in range(pending)
+    ])
+    Profile.objects.bulk_create([Profile(user=user) for user in enrolled + waiting])
+
+    first_day = date.today() - timedelta(days=days)
+    school_days = [first_day + timedelta(days=i) for i in range(days)]
+    school = []
+    for c in range(classes):
+        class_instance = Class.objects.create(
+            name=f'Class {c}', description=f'Course number {c}', teacher=teacher,
+            start_date=first_day, end_date=date.today() + timedelta(days=60),
+        )
+        class_instance.students.add(*enrolled)
+        Attendance.objects.bulk_create([
+            Attendance(student=student, classid=class_instance, date=day, status='PPPALPPE'[(i + d) % 8])
+            for d, day in enumerate(school_days)
+            for i, student in enumerate(enrolled)
+        ])
+        JoinRequest.objects.bulk_create([
+            JoinRequest(student=student, classid=class_instance) for student in waiting
+        ])
+        school.append(class_instance)
+
+    call_command('attendance_tallies', stdout=StringIO())
+    call_command('rollup_attendance', since=first_day, stdout=StringIO())
+    return teacher, school, enrolled, waiting
+
+
+# Pins the queries behind every route at a realistic data size, so a template or view change that
+# starts querying per row fails here; counts are taken with a cold cache
+class RouteQueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher, cls.school, cls.students, cls.applicants = build_school()
+        cls.class_instance = cls.school[0]
+        cls.student = cls.students[0]
+
+    def setUp(self):
+        cache.clear()
+
+    # (user, method, route name, url args, expected queries) for every route in main_app/urls.py
+    def route_budgets(self):
+        teacher, student, applicant = self.teacher, self.student, self.applicants[0]
+        class_pk, student_pk = self.class_instance.pk, self.student.pk
+        return [
+            (None, 'get', 'home', [], 0),
+            (None, 'get', 'signup', [], 0),
+            (None, 'get', 'login', [], 0),
+            (student, 'post', 'logout', [], 4),
+            (teacher, 'get', 'profile', [], 2),
+            (teacher, 'get', 'profile_detail', [student_pk], 3),
+            (teacher, 'get', 'edit_profile', [], 2),
+            (student, 'post', 'dismiss_removal_notice', [], 3),
+            (teacher, 'get', 'create_class', [], 2),
+            (teacher, 'get', 'class_detail', [class_pk], 5),
+            (student, 'get', 'class_detail', [class_pk], 4),
+            (teacher, 'get', 'manage_classes', [], 4),
+            (teacher, 'get', 'add_student', [class_pk], 5),
+            (teacher, 'get', 'import_roster', [class_pk], 3),
+            (student, 'get', 'search_classes', [], 6),
+            (teacher, 'get', 'search_typeahead', [], 2),
+            (applicant, 'post', 'send_join_request', [self.school[1].pk], 4),
+            (student, 'get', 'view_classes', [], 4),
+            (self.students[1], 'post', 'leave_class', [class_pk], 4),
+            (teacher, 'post', 'remove_student', [class_pk, self.students[2].pk], 7),
+            (teacher, 'get', 'delete_class', [class_pk], 3),
+            (teacher, 'get', 'manage_join_requests', [class_pk], 4),
+            (teacher, 'get', 'student_profile', [class_pk, student_pk], 6),
+            (teacher, 'get', 'edit_attendance', [class_pk, student_pk], 7),
+            (teacher, 'get', 'mark_attendance_inline', [class_pk, student_pk], 4),
+            (teacher, 'get', 'attendance_records', [class_pk], 4),
+            (teacher, 'get', 'class_gap_report', [class_pk], 6),
+            (teacher, 'get', 'class_matrix', [class_pk], 5),
+            (teacher, 'get', 'class_analytics', [class_pk], 10),
+            (teacher, 'get', 'term_report', [], 4),
+            (teacher, 'get', 'edit_class', [class_pk], 3),
+            (teacher, 'get', 'export_class_attendance', [class_pk], 5),
+            (teacher, 'get', 'export_teacher_attendance', [], 4),
+            (student, 'get', 'student_attendance_records', [], 3),
+            (student, 'get', 'student_class_attendance', [class_pk], 5),
+        ]
+
+    def test_every_route_has_a_budget(self):
+        budgeted = {name for _, _, name, _, _ in self.route_budgets()}
+        routes = {pattern.name for pattern in urlpatterns}
+        self.assertEqual(routes - budgeted, set())
+
+    def test_route_query_counts(self):
+        for user, method, name, args, expected in self.route_budgets():
+            with self.subTest(route=name, user=user and user.username):
+                cache.clear()
+                self.client.logout()
+                if user:
+                    self.client.force_login(user)
+                with self.assertNumQueries(expected):
+                    response = getattr(self.client, method)(reverse(name, args=args))
+                    # Streamed exports run their queries while the body is read
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                self.assertLess(response.status_code, 400)
+
+
+class SeedCommandTests(TestCase):
+    def test_seeds_requested_scale_with_skewed_marks(self):
+        call_command('seed', students=60, teachers=2, classes=6, class_size=20, days=15, ended=0, pending=3,
+                     stdout=StringIO())
+        self.assertEqual(User.objects.filter(profile__role='Student').count(), 60)
+        self.assertEqual(Class.objects.count(), 6)
+        self.assertEqual(Attendance.objects.count(), 15 * Class.students.through.objects.count())
+        self.assertEqual(AttendanceTally.objects.count(), Class.students.through.objects.count())
+        self.assertTrue(JoinRequest.objects.filter(status='Pending').exists())
+
+        # A minority of students accounts for most of the missed days
+        missed = sorted(
+            (row['missed'] for row in Attendance.objects.filter(status__in=['A', 'L'])
+             .values('student').annotate(missed=Count('pk')).order_by()),
+            reverse=True,
+        )
+        self.assertGreater(sum(missed[:len(missed) // 4]), sum(missed) / 2)
+
+    def test_refuses_to_seed_twice_without_flush(self):
+        call_command('seed', students=5, teachers=1, classes=1, class_size=3, days=2, stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('seed', students=5, teachers=1, classes=1, class_size=3, days=2, stdout=StringIO())
+        call_command('seed', students=5, teachers=1, classes=1, class_size=3, days=2, flush=True, stdout=StringIO())
+        self.assertEqual(Class.objects.count(), 1)
+
+    def test_benchmark_covers_every_read_only_page(self):
+        call_command('seed', students=20, teachers=1, classes=2, class_size=10, days=5, stdout=StringIO())
+        with tempfile.NamedTemporaryFile('r', suffix='.json') as output:
+            call_command('benchmark', iterations=1, warmup=0, json_path=output.name, stdout=StringIO())
+            report = json.load(output)
+        self.assertEqual(report['data']['classes'], 2)
+        for label, result in report['routes'].items():
+            self.assertEqual(result['status'], 200, label)
+
+
+@mock.patch('main_app.replicas.replica_alias', return_value='replica')
+class ReplicaRouterTests(SimpleTestCase):
+    router = ReplicaRouter()
+
+    def test_report_reads_go_to_replica(self, _):
+        self.assertIsNone(self.router.db_for_read(Attendance))
+        with replica_allowed():
+            self.assertEqual(self.router.db_for_read(Attendance), 'replica')
+
+    def test_versioned_cache_fills_read_primary(self, _):
+        with replica_allowed(), primary_reads():
+            self.assertIsNone(self.router.db_for_read(Class))
+
+    def test_request_reads_its_own_writes(self, _):
+        token = start_request(RequestFactory().get('/'))
+        with replica_allowed():
+            self.assertEqual(self.router.db_for_read(Attendance), 'replica')
+            self.assertIsNone(self.router.db_for_write(Attendance))
+            self.assertIsNone(self.router.db_for_read(Attendance))
+        response = finish_request(token, HttpResponse())
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], settings.REPLICA_PIN_SECONDS)
+
+    def test_pinned_browser_reads_primary(self, _):
+        request = RequestFactory().get('/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        token = start_request(request)
+        with replica_allowed():
+            self.assertIsNone(self.router.db_for_read(Attendance))
+        response = finish_request(token, HttpResponse())
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+
+@mock.patch('main_app.replicas.replica_alias', return_value='replica')
+class ReplicaPinTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('pinned'))
+
+    def test_write_pins_browser_to_primary(self, _):
+        response = self.client.post(reverse('dismiss_removal_notice'))
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_read_does_not_pin(self, _):
+        response = self.client.get(reverse('home'))
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+
+class RollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher, (cls.class_instance,), cls.students, _ = build_school(classes=1, students=4, days=6, pending=0)
+
+    def rolled_up(self):
+        return {
+            rollup.date: rollup.total
+            for rollup in DailyAttendanceRollup.objects.filter(classid=self.class_instance)
+        }
+
+    def roll_up(self):
+        call_command('rollup_attendance', stdout=StringIO())
+
+    def test_deleted_marks_are_subtracted(self):
+        self.roll_up()
+        self.students[0].delete()
+        self.roll_up()
+        self.assertEqual(set(self.rolled_up().values()), {3})
+
+    def test_marks_committed_after_the_watermark_moved_are_caught(self):
+        self.roll_up()
+        watermark = rolled_up_until()
+        day = date.today() - timedelta(days=30)
+        save_attendance(self.class_instance, self.students[0], day, 'P')
+        # Stamped before the watermark, as by a transaction that committed after the last run
+        Attendance.objects.filter(date=day).update(updated_at=watermark - timedelta(minutes=10))
+        self.roll_up()
+        self.assertEqual(self.rolled_up()[day], 1)
+
+
+class AnalyticsTests(TestCase):
+    def test_loads_every_row_across_chunks(self):
+        _, school, _, _ = build_school(classes=2, students=7, days=9, pending=0)
+        with mock.patch('main_app.analytics.LOAD_CHUNK_SIZE', 10):
+            columns = load_attendance([class_instance.pk for class_instance in school])
+
+        expected = sorted(
+            (row.student_id, row.classid_id, (row.date - date(1970, 1, 1)).days, STATUS_COLUMNS[row.status])
+            for row in Attendance.objects.all()
+        )
+        loaded = sorted(zip(*(columns[name].tolist() for name in ('student', 'classid', 'day', 'status'))))
+        self.assertEqual(loaded, expected)
+
+    def test_summary_keeps_ids_past_32_bits_apart(self):
+        big = 2 ** 32
+        columns = {
+            'student': np.array([1, 1, big + 1], dtype=np.int64),
+            'classid': np.array([big + 5, 5, 5], dtype=np.int64),
+            'day': np.array([1, 1, 1], dtype=np.int32),
+            'status': np.array([0, 1, 2], dtype=np.int8),
+        }
+        summary = summarize(columns)
+        self.assertEqual(
+            sorted(zip(summary['student'].tolist(), summary['classid'].tolist(), summary['total'].tolist())),
+            [(1, 5, 1), (1, big + 5, 1), (big + 1, 5, 1)],
+        )
+
+    def test_lateness_flags_risk_only_until_removal(self):
+        lates = [LATE_WARNING_COUNT - 1, LATE_WARNING_COUNT, LATE_REMOVAL_COUNT]
+        # Late early in term, then present for the rest, so absences stay under the warning threshold
+        marks = [
+            (student, day, 'L' if day < late else 'P') for student, late in enumerate(lates, 1) for day in range(20)
+        ]
+        student, day, status = zip(*marks)
+        summary = summarize({
+            'student': np.array(student, dtype=np.int64),
+            'classid': np.ones(len(marks), dtype=np.int64),
+            'day': np.array(day, dtype=np.int32),
+            'status': np.array([STATUS_COLUMNS[mark] for mark in status], dtype=np.int8),
+        })
+        self.assertEqual(summary['late'].tolist(), lates)
+        self.assertEqual(summary['at_risk'].tolist(), [False, True, False])
+
+class AttendanceExportTests(TestCase):
+    def test_formula_cells_are_quoted(self):
+        teacher = User.objects.create_user('exportteacher')
+        student = User.objects.create_user('@student')
+        class_instance = Class.objects.create(name='=HYPERLINK("x")', description='', teacher=teacher)
+        save_attendance(class_instance, student, date(2026, 3, 2), 'E', '+1 doctor')
+        save_attendance(class_instance, student, date(2026, 3, 3), 'P', '')
+
+        lines = list(csv.reader(''.join(attendance_csv_rows([class_instance.pk])).splitlines()))
+        self.assertEqual(lines[1], ['2026-03-02', '\'=HYPERLINK("x")', "'@student", 'Excused', "'+1 doctor"])
+        self.assertEqual(lines[2][4], '')
+
+
+class GapReportTests(TestCase):
+    def test_unsupported_database_is_reported(self):
+        teacher = User.objects.create_user('gapteacher')
+        class_instance = Class.objects.create(
+            name='Gaps', description='', teacher=teacher, start_date=date.today() - timedelta(days=3),
+        )
+        with mock.patch.object(connection, 'vendor', 'oracle'):
+            with self.assertRaisesMessage(NotSupportedError, 'oracle'):
+                MissingMarks(class_instance).count()
+
+    def test_runs_on_the_read_database(self):
+        teacher = User.objects.create_user('gapreader')
+        class_instance = Class.objects.create(
+            name='Gaps', description='', teacher=teacher, start_date=date.today() - timedelta(days=3),
+        )
+        with mock.patch('main_app.gaps.router.db_for_read', return_value='default') as db_for_read:
+            MissingMarks(class_instance).count()
+        db_for_read.assert_called_with(Attendance)
+
+
+class ClassMatrixTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher, (cls.class_instance,), cls.students, _ = build_school(classes=1, students=3, days=5, pending=0)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.teacher)
+        self.url = reverse('class_matrix', args=[self.class_instance.pk])
+
+    def test_cached_fragment_skips_the_matrix(self):
+        self.client.get(self.url)
+        with mock.patch('main_app.matrix.attendance_matrix') as attendance_matrix:
+            response = self.client.get(self.url)
+        attendance_matrix.assert_not_called()
+        self.assertContains(response, f'<td class="text-start">{self.students[0].username}</td>', html=False)
+
+    def test_new_mark_shows_up(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            save_attendance(self.class_instance, self.students[0], date.today(), 'E', '')
+        response = self.client.get(self.url)
+        self.assertEqual(response.context['table']['dates'][-1], date.today())
+
+
+class ClassAccessTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher, (cls.class_instance,), cls.students, cls.applicants = build_school(
+            classes=1, students=2, days=3, pending=1)
+        cls.other_teacher = User.objects.create_user('otherteacher')
+        cls.other_teacher.profile.role = 'Teacher'
+        cls.other_teacher.profile.save()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_only_the_class_teacher_reaches_its_records(self):
+        class_pk = self.class_instance.pk
+        urls = [
+            reverse('edit_attendance', args=[class_pk, self.students[0].pk]),
+            reverse('attendance_records', args=[class_pk]),
+            reverse('class_matrix', args=[class_pk]),
+            reverse('export_class_attendance', args=[class_pk]),
+        ]
+        for user in (self.other_teacher, self.students[0]):
+            self.client.force_login(user)
+            for url in urls:
+                with self.subTest(user=user.username, url=url):
+                    self.assertRedirects(self.client.get(url), reverse('home'), fetch_redirect_response=False)
+
+    def test_marks_are_limited_to_the_roster(self):
+        self.client.force_login(self.teacher)
+        outsider = self.applicants[0]
+        for name in ('edit_attendance', 'mark_attendance_inline'):
+            with self.subTest(name=name):
+                response = self.client.post(reverse(name, args=[self.class_instance.pk, outsider.pk]), {
+                    'selected_date': date.today(), 'status': 'P', 'reason': '',
+                })
+                self.assertEqual(response.status_code, 404)
+        self.assertFalse(Attendance.objects.filter(student=outsider).exists())
+
+class JoinRequestDecisionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher, cls.school, _, cls.applicants = build_school(classes=2, students=1, days=0, pending=3)
+        cls.class_instance, cls.other_class = cls.school
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.teacher)
+        self.url = reverse('manage_join_requests', args=[self.class_instance.pk])
+
+    def pending(self, class_instance):
+        return JoinRequest.objects.filter(classid=class_instance, status='Pending')
+
+    def enrolled(self, class_instance):
+        return set(class_instance.students.filter(pk__in=[a.pk for a in self.applicants]).values_list('pk', flat=True))
+
+    def test_requests_of_another_class_are_ignored(self):
+        foreign = self.pending(self.other_class).first()
+        self.client.post(self.url, {'action': 'approve', 'request_ids': [foreign.pk]})
+
+        foreign.refresh_from_db()
+        self.assertEqual(foreign.status, 'Pending')
+        self.assertEqual(self.enrolled(self.class_instance) | self.enrolled(self.other_class), set())
+
+    def test_approve_all_enrolls_only_this_class(self):
+        self.client.post(self.url, {'action': 'approve_all'})
+
+        self.assertFalse(self.pending(self.class_instance).exists())
+        self.assertEqual(self.enrolled(self.class_instance), {a.pk for a in self.applicants})
+        self.assertEqual(self.pending(self.other_class).count(), len(self.applicants))
+        self.assertEqual(self.enrolled(self.other_class), set())
+
+    def test_reject_leaves_the_roster_alone(self):
+        request_ids = list(self.pending(self.class_instance).values_list('pk', flat=True)[:2])
+        roster = set(self.class_instance.students.values_list('pk', flat=True))
+        self.client.post(self.url, {'action': 'reject', 'request_ids': request_ids})
+
+        self.assertEqual(
+            set(JoinRequest.objects.filter(pk__in=request_ids).values_list('status', flat=True)), {'Rejected'})
+        self.assertEqual(self.pending(self.class_instance).count(), len(self.applicants) - 2)
+        self.assertEqual(set(self.class_instance.students.values_list('pk', flat=True)), roster)
+
+class RosterImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher, (cls.class_instance,), cls.students, cls.applicants = build_school(
+            classes=1, students=1, days=0, pending=2)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.teacher)
+        self.url = reverse('import_roster', args=[self.class_instance.pk])
+        self.usernames = 'applicant000, applicant001\nstudent000\nnobody\nteacher'
+
+    def roster(self):
+        return set(self.class_instance.students.values_list('username', flat=True))
+
+    def test_preview_writes_nothing(self):
+        response = self.client.post(self.url, {'usernames': self.usernames, 'dry_run': 'on'})
+
+        preview = response.context['preview']
+        self.assertEqual([user.username for user in preview['to_add']], ['applicant000', 'applicant001'])
+        self.assertEqual(preview['already_enrolled'], ['student000'])
+        self.assertEqual(self.roster(), {'student000'})
+
+    def test_commit_enrolls_and_reports_skipped_entries(self):
+        roster_file = SimpleUploadedFile('roster.csv', b'username\napplicant001\nnobody\n', content_type='text/csv')
+        response = self.client.post(self.url, {'usernames': 'applicant000 teacher', 'roster_file': roster_file})
+
+        self.assertRedirects(response, reverse('class_detail', args=[self.class_instance.pk]),
+                             fetch_redirect_response=False)
+        self.assertEqual(self.roster(), {'student000', 'applicant000', 'applicant001'})
+        self.assertEqual(
+            [message.message for message in get_messages(response.wsgi_request)],
+            ['Added 2 students to the class.', 'Skipped 1 unknown and 1 non-student entries.'],
+        )
+
+    def test_preview_lists_unknown_names_and_non_students(self):
+        preview = self.client.post(self.url, {'usernames': self.usernames, 'dry_run': 'on'}).context['preview']
+
+        self.assertEqual((preview['unknown'], preview['not_students']), (['nobody'], ['teacher']))
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher, cls.school, cls.students, _ = build_school(
+            classes=SEARCH_PAGE_SIZE + 1, students=TYPEAHEAD_LIMIT + 3, days=0, pending=0)
+
+    def setUp(self):
+        cache.clear()
+
+    def suggestions(self, user, **query):
+        self.client.force_login(user)
+        return self.client.get(reverse('search_typeahead'), query)
+
+    def test_typeahead_pages_are_limited_and_disjoint(self):
+        first = self.suggestions(self.teacher, kind='students', q='student').json()
+        second = self.suggestions(self.teacher, kind='students', q='student', page=2).json()
+
+        self.assertEqual((len(first['results']), first['has_more']), (TYPEAHEAD_LIMIT, True))
+        self.assertEqual((len(second['results']), second['has_more']), (3, False))
+        self.assertEqual(
+            [row['id'] for row in first['results'] + second['results']],
+            sorted(student.pk for student in self.students),
+        )
+
+    def test_students_cannot_search_students(self):
+        response = self.suggestions(self.students[0], kind='students', q='student')
+        self.assertEqual(response.status_code, 403)
+
+    def test_class_search_paginates(self):
+        self.client.force_login(self.students[0])
+        pages = [
+            self.client.get(reverse('search_classes'), {'query': 'class', 'page': number}).context['classes']
+            for number in (1, 2)
+        ]
+
+        self.assertEqual([len(classes) for classes in pages], [SEARCH_PAGE_SIZE, 1])
+        self.assertEqual(
+            sorted(c.pk for classes in pages for c in classes), sorted(c.pk for c in self.school))
+
+class StandingNavTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        teacher = User.objects.create_user('navteacher')
+        self.student = User.objects.create_user('navstudent')
+        self.class_instance = Class.objects.create(name='Nav', description='', teacher=teacher)
+        self.class_instance.students.add(self.student)
+        self.client.force_login(self.student)
+
+    def mark(self, status, days):
+        with self.captureOnCommitCallbacks(execute=True):
+            for days_ago in range(days):
+                save_attendance(self.class_instance, self.student, date.today() - timedelta(days=days_ago), status)
+        return self.client.get(reverse('home'))
+
+    def test_flags_follow_attendance_writes(self):
+        late_flag = 'You have received a lateness warning!'
+        absence_flag = f'Your absences are above {ABSENCE_WARNING_PCT}%!'
+
+        response = self.mark('L', LATE_WARNING_COUNT)
+        self.assertContains(response, late_flag)
+        self.assertNotContains(response, absence_flag)
+
+        response = self.mark('A', LATE_WARNING_COUNT)
+        self.assertNotContains(response, late_flag)
+        self.assertContains(response, absence_flag)
+
+        response = self.mark('P', LATE_WARNING_COUNT)
+        self.assertNotContains(response, late_flag)
+        self.assertNotContains(response, absence_flag)
+
+class ClassCacheVersionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user('versionteacher')
+        self.teacher.profile.role = 'Teacher'
+        self.teacher.profile.save()
+        self.student = User.objects.create_user('versionstudent')
+        self.class_instance = Class.objects.create(name='Versioned', description='', teacher=self.teacher)
+        self.class_instance.students.add(self.student)
+        self.url = reverse('class_detail', args=[self.class_instance.pk])
+
+    def test_removed_student_loses_access_at_once(self):
+        self.client.force_login(self.student)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        version = cache.get(class_version_key(self.class_instance.pk))
+
+        self.client.force_login(self.teacher)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('remove_student', args=[self.class_instance.pk, self.student.pk]))
+
+        self.assertNotEqual(cache.get(class_version_key(self.class_instance.pk)), version)
+        self.client.force_login(self.student)
+        self.assertRedirects(self.client.get(self.url), reverse('home'), fetch_redirect_response=False)
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        build_school(classes=1, students=3, days=7, pending=0)
+
+    # Follows next cursors to the end, then previous cursors back to the start
+    def walk(self, paginate):
+        forward, page = [], paginate()
+        forward.append([row.pk for row in page['object_list']])
+        while page['next_cursor']:
+            page = paginate(after=page['next_cursor'])
+            forward.append([row.pk for row in page['object_list']])
+        backward = [[row.pk for row in page['object_list']]]
+        while page['previous_cursor']:
+            page = paginate(before=page['previous_cursor'])
+            backward.insert(0, [row.pk for row in page['object_list']])
+        return forward, backward
+
+    def test_pages_cover_every_row_once_in_both_directions(self):
+        queryset = Attendance.objects.all()
+        newest_first = list(queryset.order_by('-date', '-pk').values_list('pk', flat=True))
+        oldest_first = list(queryset.order_by('date', 'pk'))
+        for name, paginate in [
+            ('queryset', lambda **cursor: keyset_page(queryset, 4, **cursor)),
+            ('list', lambda **cursor: keyset_list_page(oldest_first, 4, **cursor)),
+        ]:
+            with self.subTest(name):
+                forward, backward = self.walk(paginate)
+                self.assertEqual([pk for page in forward for pk in page], newest_first)
+                self.assertTrue(all(len(page) == 4 for page in forward[:-1]))
+                self.assertEqual(backward, forward)
+
+class AttendanceArchiveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher, cls.school, cls.students, _ = build_school(classes=2, students=6, days=12)
+        cls.ended, cls.running = cls.school
+        Class.objects.filter(pk=cls.ended.pk).update(end_date=date.today() - timedelta(days=2))
+        Attendance.objects.filter(classid=cls.ended, student=cls.students[1], date=date.today() - timedelta(days=3)).delete()
+
+    def setUp(self):
+        archive_root = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_root.cleanup)
+        self.enterContext(override_settings(ATTENDANCE_ARCHIVE_ROOT=archive_root.name))
+        cache.clear()
+
+    def archive(self):
+        call_command('archive_attendance', grace_days=0, stdout=StringIO())
+        self.ended.refresh_from_db()
+        cache.clear()
+
+    # What every history page shows for the ended class, as plain values
+    def history(self):
+        student = self.students[1]
+        ended_pk = self.ended.pk
+        self.client.force_login(self.teacher)
+        teacher_pages = {
+            name: self.client.get(reverse(name, args=args), query)
+            for name, args, query in [
+                ('attendance_records', [ended_pk], {'status': 'A'}),
+                ('student_profile', [ended_pk, student.pk], {}),
+                ('class_matrix', [ended_pk], {}),
+                ('class_gap_report', [ended_pk], {}),
+                ('class_analytics', [ended_pk], {}),
+            ]
+        }
+        export = b''.join(self.client.get(reverse('export_teacher_attendance')).streaming_content)
+        self.client.force_login(student)
+        student_page = self.client.get(reverse('student_class_attendance', args=[ended_pk]))
+        return {
+            'records': [
+                (r.pk, r.date, r.student.username, r.status)
+                for r in teacher_pages['attendance_records'].context['page']['object_list']
+            ],
+            'profile': [(r.date, r.status) for r in teacher_pages['student_profile'].context['attendance_records']],
+            'matrix': teacher_pages['class_matrix'].context['table']['rows'],
+            'gaps': [(s.pk, day) for s, day in teacher_pages['class_gap_report'].context['page'].object_list],
+            'analytics': [
+                (row['student'].pk, row['total'], row['absence_pct'])
+                for row in teacher_pages['class_analytics'].context['report']
+            ],
+            'export': sorted(export.decode().splitlines()),
+            'student': [(r.date, r.status) for r in student_page.context['page'].object_list],
+        }
+
+    def test_history_pages_read_transparently_from_archive(self):
+        before = self.history()
+        self.archive()
+
+        self.assertIsNotNone(self.ended.archived_at)
+        self.assertFalse(Attendance.objects.filter(classid=self.ended).exists())
+        self.assertTrue(Attendance.objects.filter(classid=self.running).exists())
+        self.assertEqual(self.history(), before)
+
+    def test_derived_tables_survive_rebuilds(self):
+        self.archive()
+        tallies = AttendanceTally.objects.filter(classid=self.ended).count()
+        rollups = DailyAttendanceRollup.objects.filter(classid=self.ended).count()
+        call_command('attendance_tallies', stdout=StringIO())
+        call_command('rollup_attendance', since=date.today() - timedelta(days=30), stdout=StringIO())
+        call_command('rollup_attendance', stdout=StringIO())
+        self.assertEqual(AttendanceTally.objects.filter(classid=self.ended).count(), tallies)
+        self.assertEqual(DailyAttendanceRollup.objects.filter(classid=self.ended).count(), rollups)
+        self.assertGreater(rollups, 0)
+
+    def test_archived_attendance_cannot_be_changed(self):
+        self.archive()
+        self.client.force_login(self.teacher)
+        self.client.post(reverse('mark_attendance_inline', args=[self.ended.pk, self.students[0].pk]), {'status': 'P'})
+        self.assertFalse(Attendance.objects.filter(classid=self.ended).exists())
+
+    def test_deleted_students_drop_out_of_archived_history(self):
+        self.archive()
+        self.students[1].delete()
+        self.client.force_login(self.teacher)
+
+        records = self.client.get(reverse('attendance_records', args=[self.ended.pk]))
+        self.assertEqual(records.status_code, 200)
+        self.assertNotIn(self.students[1], [r.student for r in records.context['page']['object_list']])
+        export = b''.join(
+            self.client.get(reverse('export_class_attendance', args=[self.ended.pk])).streaming_content
+        ).decode()
+        self.assertIn(self.students[0].username, export)
+        self.assertNotIn(self.students[1].username, export)
+
+    def test_restore_moves_rows_back(self):
+        marks = set(Attendance.objects.filter(classid=self.ended).values_list('pk', 'student', 'date', 'status'))
+        self.archive()
+        call_command('archive_attendance', class_ids=[self.ended.pk], restore=True, stdout=StringIO())
+        self.ended.refresh_from_db()
+        self.assertIsNone(self.ended.archived_at)
+        self.assertEqual(
+            set(Attendance.objects.filter(classid=self.ended).values_list('pk', 'student', 'date', 'status')), marks,
+        )
@@ -14,25 +14,35 @@ urlpatterns = [
     path('profile/', views.profile, name='profile'),
     path('profile/<int:user_id>/', views.profile_detail, name='profile_detail'),
     path('profile/edit/', views.edit_profile, name='edit_profile'),
+    path('profile/dismiss_notice/', views.dismiss_removal_notice, name='dismiss_removal_notice'),
 
     # Class management routes
     path('class/create/', views.create_class, name='create_class'),
     path('class/<int:pk>/', views.class_detail, name='class_detail'),
     path('classes/manage/', views.manage_classes, name='manage_classes'),
     path('class/<int:pk>/add_student/', views.add_student, name='add_student'),
+    path('class/<int:pk>/import_roster/', views.import_roster, name='import_roster'),
     path('classes/search/', views.search_classes, name='search_classes'),
+    path('search/typeahead/', views.search_typeahead, name='search_typeahead'),
     path('class/<int:pk>/join/', views.send_join_request, name='send_join_request'),
     path('classes/', views.view_classes, name='view_classes'),
     path('class/<int:pk>/leave/', views.leave_class, name='leave_class'),
     path('class/<int:class_pk>/remove_student/<int:student_pk>/', views.remove_student, name='remove_student'),
     path('class/<int:class_id>/delete/', views.delete_class, name='delete_class'),
     path('class/<int:pk>/join_requests/', views.manage_join_requests, name='manage_join_requests'),
-    path('class/<int:class_pk>/student/<int:pk>/', views.profile_detail, name='student_profile'),
+    path('class/<int:class_pk>/student/<int:user_id>/', views.profile_detail, name='student_profile'),
     path('class/<int:class_pk>/edit_attendance/<int:student_pk>/', views.edit_attendance, name='edit_attendance'),
 
     # Attendance management routes
     path('class/<int:class_pk>/mark_attendance/<int:student_pk>/', views.mark_attendance_inline, name='mark_attendance_inline'),
     path('class/<int:class_id>/attendance_records/', views.attendance_records, name='attendance_records'),
+    path('class/<int:pk>/missing_attendance/', views.class_gap_report, name='class_gap_report'),
+    path('class/<int:pk>/matrix/', views.class_matrix, name='class_matrix'),
+    path('class/<int:pk>/analytics/', views.class_analytics, name='class_analytics'),
+    path('classes/term_report/', views.term_report, name='term_report'),
     path('class/<int:class_id>/edit/', views.edit_class, name='edit_class'),
+    path('class/<int:class_id>/export/', views.export_class_attendance, name='export_class_attendance'),
+    path('classes/export/', views.export_teacher_attendance, name='export_teacher_attendance'),
     path('attendance/', views.student_attendance_records, name='student_attendance_records'),
+    path('attendance/class/<int:class_pk>/', views.student_class_attendance, name='student_class_attendance'),
 ]
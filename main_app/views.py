@@ -1,4 +1,5 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import JsonResponse, StreamingHttpResponse
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.views import LoginView, LogoutView
@@ -7,15 +8,40 @@ from django.contrib import messages
 from django.urls import reverse_lazy
 from django.utils import timezone
 from django.forms import modelformset_factory
-from datetime import timedelta, date
-from .models import Profile, Class, Attendance, JoinRequest
+from django.core.paginator import Paginator
+from asgiref.sync import sync_to_async
+from .models import Profile, Class, Attendance, AttendanceTally, JoinRequest
 from .forms import (
     UserRegistrationForm, ProfileForm, ClassForm,
-    StudentSearchForm, AttendanceForm)
+    StudentSearchForm, AttendanceForm, RollCallEntryForm, EditAttendanceForm, AttendanceFilterForm,
+    RosterImportForm)
+from .attendance import commit_roll_call, save_attendance
+from .access import (
+    get_class, aget_class, aclass_roster, is_class_teacher, class_teacher_required, async_login_required,
+    enrolled_classes, taught_classes, member_class_ids, pending_class_ids)
+from .pagination import keyset_page, keyset_list_page
+from .archive import archived_records, with_students
+from .replicas import replica_reads
+from .gaps import MissingMarks
+from .matrix import lazy_matrix_table
+from .caching import class_version
+from . import rules
+from .analytics import student_report, rollup_trend
+from .rollups import rolled_up_until, term_summaries
+from .exports import attendance_csv_rows
+from .roster import JOIN_DECISIONS, parse_usernames, resolve_roster, enroll_students, decide_join_requests
+from .search import SEARCH_PAGE_SIZE, class_search_page, find_students, typeahead
+import csv
 import logging
 
 logger = logging.getLogger(__name__)
 
+STUDENT_RECORDS_PER_PAGE = 25
+CLASS_RECORDS_PER_PAGE = 50
+GAP_REPORT_PER_PAGE = 50
+UNMARKED_DATES_SHOWN = 31
+ARCHIVED_CLASS_MESSAGE = "This class has ended and its attendance is archived, so it can no longer be changed."
+
 # Handles user sign-up and auto-login
 def signup(request):
     if request.method == 'POST':
@@ -49,7 +75,7 @@ def profile(request):
 # Allows the user to edit their profile details
 @login_required
 def edit_profile(request):
-    profile = get_object_or_404(Profile, user=request.user)
+    profile = request.user.profile
     if request.method == 'POST':
         form = ProfileForm(request.POST, request.FILES, instance=profile)
         if form.is_valid():
@@ -65,6 +91,15 @@ def edit_profile(request):
         'completion_percentage': completion_percentage
     })
 
+# Clears the student's class removal notice from the nav once they have read it
+@login_required
+def dismiss_removal_notice(request):
+    if request.method == 'POST':
+        profile = request.user.profile
+        profile.removal_notice = ''
+        profile.save(update_fields=['removal_notice'])
+    return redirect('home')
+
 # Renders the home page
 def home(request):
     return render(request, 'home.html')
@@ -86,80 +121,97 @@ def create_class(request):
         form = ClassForm()
     return render(request, 'create_class.html', {'form': form})
 
-# Displays details of a specific class
-@login_required
-def class_detail(request, pk):
-    class_instance = get_object_or_404(Class, pk=pk)
-    students = class_instance.students.all()
+# Displays details of a specific class; reads use the async ORM, a submitted roll call is saved synchronously
+@async_login_required
+async def class_detail(request, pk):
+    class_instance = await aget_class(request, pk)
+    students = await aclass_roster(class_instance)
     today = timezone.now().date()
 
-    if request.user.profile.role == 'Student' and not students.filter(pk=request.user.pk).exists():
+    if request.user.profile.role == 'Student' and request.user not in students:
         messages.warning(request, "You are no longer enrolled in this class.")
         return redirect('home')
 
-    if request.user.profile.role == 'Teacher' and request.user == class_instance.teacher:
-        attendance_qs = Attendance.objects.filter(classid=class_instance, date=today)
-        attendance_marked = attendance_qs.exists()
-
-        if request.method == 'POST':
-            total_forms = int(request.POST.get('TOTAL_FORMS', 0))
-            forms = [
-                AttendanceForm(request.POST, prefix=f'form-{i}')
-                for i in range(total_forms)
-            ]
-
-            if all(form.is_valid() for form in forms):
-                for form in forms:
-                    attendance = form.save(commit=False)
-                    attendance.classid = class_instance
-                    attendance.date = today
-                    attendance.save()
-                    process_attendance_rules(attendance, class_instance)
-
-                messages.success(request, "Attendance marked for all students!")
-                return redirect('class_detail', pk=pk)
-        else:
-            forms = []
-            if not attendance_marked:
-                forms = [
-                    AttendanceForm(initial={'student': student.pk}, prefix=f'form-{i}')
-                    for i, student in enumerate(students)
-                ]
-            else:
-                attendance_dict = {att.student_id: att for att in attendance_qs}
-                forms = [
-                    AttendanceForm(
-                        initial={
-                            'student': student.pk,
-                            'status': attendance_dict.get(student.pk).status if student.pk in attendance_dict else '',
-                            'reason': attendance_dict.get(student.pk).reason if student.pk in attendance_dict else ''
-                        },
-                        prefix=f'form-{i}'
-                    )
-                    for i, student in enumerate(students)
-                ]
-
-        management_form = {
-            'TOTAL_FORMS': len(students),
-            'INITIAL_FORMS': 0,
-        }
-
-        zipped_data = zip(forms, students)
-
+    if not is_class_teacher(request, class_instance):
         return render(request, 'class_detail.html', {
             'class': class_instance,
-            'forms': forms,
-            'zipped_data': zipped_data,
             'students': students,
             'date': today,
-            'management_form': management_form,
-            'attendance_marked': attendance_marked,
         })
 
+    if request.method == 'POST':
+        return await sync_to_async(take_roll_call)(request, class_instance, students, today)
+
+    marks = {
+        att.student_id: att
+        async for att in Attendance.objects.filter(classid=class_instance, date=today)
+    }
+    forms = [
+        RollCallEntryForm(
+            initial={
+                'student': student.pk,
+                'status': marks[student.pk].status if student.pk in marks else '',
+                'reason': marks[student.pk].reason if student.pk in marks else '',
+            },
+            prefix=f'form-{i}'
+        )
+        for i, student in enumerate(students)
+    ]
+    return render_roll_call(request, class_instance, students, today, forms, bool(marks))
+
+# Validates and saves the roll call a teacher submitted from the class page
+def take_roll_call(request, class_instance, students, today):
+    if class_instance.archived_at:
+        messages.error(request, ARCHIVED_CLASS_MESSAGE)
+        return redirect('class_detail', pk=class_instance.pk)
+
+    total_forms = int(request.POST.get('TOTAL_FORMS', 0))
+    forms = [
+        RollCallEntryForm(request.POST, prefix=f'form-{i}')
+        for i in range(total_forms)
+    ]
+    roster = {student.pk: student for student in students}
+
+    for form in forms:
+        if form.is_valid() and form.cleaned_data['student'] not in roster:
+            form.add_error('student', "This student is not enrolled in the class.")
+
+    if all(form.is_valid() for form in forms):
+        entries = [
+            (roster[form.cleaned_data['student']], form.cleaned_data['status'], form.cleaned_data['reason'])
+            for form in forms
+        ]
+        warned, removed = commit_roll_call(class_instance, entries, today)
+
+        # The worker applies the rules and emails the notices; the teacher hears about them right away
+        for student in warned:
+            messages.warning(request, f"{student.username} has received a warning for lateness.")
+        for student in removed:
+            messages.warning(
+                request,
+                f"{student.username} is being removed from {class_instance.name} due to repeated lateness.",
+            )
+        messages.success(request, "Attendance marked for all students!")
+        return redirect('class_detail', pk=class_instance.pk)
+
+    attendance_marked = Attendance.objects.filter(classid=class_instance, date=today).exists()
+    return render_roll_call(request, class_instance, students, today, forms, attendance_marked)
+
+# Renders the teacher's class page with the roll-call forms
+def render_roll_call(request, class_instance, students, today, forms, attendance_marked):
+    management_form = {
+        'TOTAL_FORMS': len(students),
+        'INITIAL_FORMS': 0,
+    }
+
     return render(request, 'class_detail.html', {
         'class': class_instance,
+        'forms': forms,
+        'zipped_data': zip(forms, students),
         'students': students,
         'date': today,
+        'management_form': management_form,
+        'attendance_marked': attendance_marked,
     })
 
 # Lists all classes managed by the teacher
@@ -167,16 +219,13 @@ def class_detail(request, pk):
 def manage_classes(request):
     if request.user.profile.role != 'Teacher':
         return redirect('home')
-    classes = Class.objects.filter(teacher=request.user)
-    return render(request, 'manage_classes.html', {'classes': classes})
+    return render(request, 'manage_classes.html', {'classes': taught_classes(request.user)})
 
 # Allows a teacher to edit class details
 @login_required
+@class_teacher_required('class_id', "You are not authorized to edit this class.")
 def edit_class(request, class_id):
-    class_instance = get_object_or_404(Class, pk=class_id)
-    if request.user.profile.role != 'Teacher' or request.user != class_instance.teacher:
-        messages.error(request, "You are not authorized to edit this class.")
-        return redirect('home')
+    class_instance = request.class_instance
 
     if request.method == 'POST':
         form = ClassForm(request.POST, instance=class_instance)
@@ -191,11 +240,9 @@ def edit_class(request, class_id):
 
 # Allows a teacher to delete a class
 @login_required
+@class_teacher_required('class_id', "You are not authorized to delete this class.")
 def delete_class(request, class_id):
-    class_instance = get_object_or_404(Class, pk=class_id)
-    if request.user.profile.role != 'Teacher' or request.user != class_instance.teacher:
-        messages.error(request, "You are not authorized to delete this class.")
-        return redirect('home')
+    class_instance = request.class_instance
 
     if request.method == 'POST':
         class_instance.delete()
@@ -206,11 +253,9 @@ def delete_class(request, class_id):
 
 # Allows a teacher to add a student to their class
 @login_required
+@class_teacher_required('pk')
 def add_student(request, pk):
-    class_instance = get_object_or_404(Class, pk=pk)
-
-    if request.user.profile.role != 'Teacher' or request.user != class_instance.teacher:
-        return redirect('home')
+    class_instance = request.class_instance
 
     search_results = []
     search_query = ''
@@ -233,10 +278,7 @@ def add_student(request, pk):
                 else:
                     search_form.add_error('username', 'This user is not a Student.')
             except User.DoesNotExist:
-                search_results = User.objects.filter(
-                    username__icontains=search_query, 
-                    profile__role='Student'
-                ).exclude(pk__in=class_instance.students.values_list('pk', flat=True))
+                search_results = list(find_students(search_query, exclude_class=class_instance)[:SEARCH_PAGE_SIZE])
                 if not search_results:
                     search_form.add_error('username', 'User not found.')
     else:
@@ -249,12 +291,45 @@ def add_student(request, pk):
         'search_query': search_query,
     })
 
+# Allows a teacher to add a whole roster of students to their class in one go
+@login_required
+@class_teacher_required('pk')
+def import_roster(request, pk):
+    class_instance = request.class_instance
+
+    preview = None
+    if request.method == 'POST':
+        form = RosterImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            try:
+                usernames = parse_usernames(form.cleaned_data['usernames'], form.cleaned_data['roster_file'])
+            except (UnicodeDecodeError, csv.Error):
+                form.add_error('roster_file', 'The file could not be read as a UTF-8 CSV.')
+            else:
+                preview = resolve_roster(class_instance, usernames)
+                if not form.cleaned_data['dry_run']:
+                    enroll_students(class_instance, preview['to_add'])
+                    messages.success(request, f"Added {len(preview['to_add'])} students to the class.")
+                    if preview['unknown'] or preview['not_students']:
+                        messages.warning(
+                            request,
+                            f"Skipped {len(preview['unknown'])} unknown and {len(preview['not_students'])} non-student entries."
+                        )
+                    return redirect('class_detail', pk=pk)
+    else:
+        form = RosterImportForm()
+
+    return render(request, 'import_roster.html', {
+        'class': class_instance,
+        'form': form,
+        'preview': preview,
+    })
+
 # Allows a teacher to remove a student from their class
 @login_required
+@class_teacher_required('class_pk')
 def remove_student(request, class_pk, student_pk):
-    class_instance = get_object_or_404(Class, pk=class_pk)
-    if request.user.profile.role != 'Teacher' or request.user != class_instance.teacher:
-        return redirect('home')
+    class_instance = request.class_instance
 
     student_user = get_object_or_404(User, pk=student_pk)
 
@@ -274,15 +349,15 @@ def remove_student(request, class_pk, student_pk):
     return redirect('class_detail', pk=class_pk)
 
 # Lists all classes a student is enrolled in
-@login_required
-def view_classes(request):
-    enrolled = request.user.enrolled_classes.all()
+@async_login_required
+async def view_classes(request):
+    enrolled = await sync_to_async(enrolled_classes)(request.user)
     return render(request, 'view_classes.html', {'classes': enrolled})
 
 # Allows a student to leave a class
 @login_required
 def leave_class(request, pk):
-    class_instance = get_object_or_404(Class, pk=pk)
+    class_instance = get_class(request, pk)
     if request.user.profile.role != 'Student':
         return redirect('home')
     class_instance.students.remove(request.user)
@@ -292,7 +367,7 @@ def leave_class(request, pk):
 # Allows a student to request to join a class
 @login_required
 def send_join_request(request, pk):
-    class_instance = get_object_or_404(Class, pk=pk)
+    class_instance = get_class(request, pk)
     if request.user.profile.role != 'Student':
         return redirect('home')
 
@@ -304,27 +379,40 @@ def send_join_request(request, pk):
         messages.info(request, "You already have a pending or decided request.")
     return redirect('class_detail', pk=pk)
 
-# Allows a teacher to manage join requests
+# Allows a teacher to approve or reject join requests, one at a time, a selection, or all at once
 @login_required
+@class_teacher_required('pk')
 def manage_join_requests(request, pk):
-    class_instance = get_object_or_404(Class, pk=pk)
-    if request.user.profile.role != 'Teacher' or request.user != class_instance.teacher:
-        return redirect('home')
+    class_instance = request.class_instance
 
-    join_requests = JoinRequest.objects.filter(classid=class_instance, status='Pending')
     if request.method == 'POST':
-        req_id = request.POST.get('request_id')
-        action = request.POST.get('action')
-        jr = get_object_or_404(JoinRequest, pk=req_id)
-        if action == 'approve':
-            jr.status = 'Approved'
-            jr.save()
-            class_instance.students.add(jr.student)
-            messages.success(request, f"Approved {jr.student.username}.")
-        elif action == 'reject':
-            jr.status = 'Rejected'
-            jr.save()
-            messages.info(request, f"Rejected {jr.student.username}.")
+        action = request.POST.get('action', '')
+        if action.endswith('_all'):
+            action, request_ids = action[:-len('_all')], None
+        else:
+            request_ids = [
+                int(value) for value in request.POST.getlist('request_ids') + request.POST.getlist('request_id')
+                if value.isdigit()
+            ]
+
+        if action in JOIN_DECISIONS and request_ids != []:
+            decided = decide_join_requests(class_instance, action, request_ids)
+            noun = 'request' if len(decided) == 1 else 'requests'
+            if not decided:
+                messages.warning(request, "None of those join requests are pending for this class.")
+            elif action == 'approve':
+                messages.success(request, f"Approved {len(decided)} join {noun}.")
+            else:
+                messages.info(request, f"Rejected {len(decided)} join {noun}.")
+        else:
+            messages.warning(request, "Select at least one join request.")
+        return redirect('manage_join_requests', pk=pk)
+
+    join_requests = (
+        JoinRequest.objects.filter(classid=class_instance, status='Pending')
+        .select_related('student')
+        .order_by('created_at')
+    )
     return render(request, 'manage_join_requests.html', {
         'class': class_instance,
         'join_requests': join_requests
@@ -332,21 +420,22 @@ def manage_join_requests(request, pk):
 
 # Allows a teacher to mark attendance for a single student
 @login_required
+@class_teacher_required('class_pk')
 def mark_attendance_inline(request, class_pk, student_pk):
-    class_instance = get_object_or_404(Class, pk=class_pk)
-    if request.user.profile.role != 'Teacher' or request.user != class_instance.teacher:
-        return redirect('home')
+    class_instance = request.class_instance
 
-    student_user = get_object_or_404(User, pk=student_pk)
+    student_user = get_object_or_404(class_instance.students, pk=student_pk)
 
     if request.method == 'POST':
+        if class_instance.archived_at:
+            messages.error(request, ARCHIVED_CLASS_MESSAGE)
+            return redirect('class_detail', pk=class_pk)
         form = AttendanceForm(request.POST)
         if form.is_valid():
-            attendance = form.save(commit=False)
-            attendance.classid = class_instance
-            attendance.student = student_user
-            attendance.date = timezone.now().date()
-            attendance.save()
+            save_attendance(
+                class_instance, student_user, timezone.now().date(),
+                form.cleaned_data['status'], form.cleaned_data['reason'] or '',
+            )
             messages.success(request, "Attendance marked.")
             return redirect('class_detail', pk=class_pk)
     else:
@@ -357,94 +446,140 @@ def mark_attendance_inline(request, class_pk, student_pk):
         'student_user': student_user
     })
 
-# Lists attendance records for a teacher or admin
+# Lets a teacher browse a class's attendance records, newest first, with filters
+@login_required
+@class_teacher_required('class_id', "You are not authorized to view this class.")
+@replica_reads
+def attendance_records(request, class_id):
+    class_instance = request.class_instance
+
+    filter_form = AttendanceFilterForm(request.GET)
+    since = until = status = None
+    if filter_form.is_valid():
+        since = filter_form.cleaned_data['date_from']
+        until = filter_form.cleaned_data['date_to']
+        status = filter_form.cleaned_data['status']
+
+    if class_instance.archived_at:
+        page = keyset_list_page(
+            with_students(archived_records(class_instance, since=since, until=until, status=status)),
+            CLASS_RECORDS_PER_PAGE, after=request.GET.get('after'), before=request.GET.get('before'),
+        )
+    else:
+        records = Attendance.objects.filter(classid=class_instance).select_related('student')
+        if since:
+            records = records.filter(date__gte=since)
+        if until:
+            records = records.filter(date__lte=until)
+        if status:
+            records = records.filter(status=status)
+        page = keyset_page(
+            records, CLASS_RECORDS_PER_PAGE,
+            after=request.GET.get('after'), before=request.GET.get('before'),
+        )
+
+    filters = request.GET.copy()
+    filters.pop('after', None)
+    filters.pop('before', None)
+
+    return render(request, 'class_attendance_records.html', {
+        'class': class_instance,
+        'filter_form': filter_form,
+        'page': page,
+        'filter_query': filters.urlencode(),
+    })
+
+# Streams a CSV file of attendance rows for the given classes
+def attendance_csv_response(classes, filename):
+    response = StreamingHttpResponse(attendance_csv_rows(classes), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+# Exports every attendance record of one class as CSV
 @login_required
-def attendance_records(request):
-    records = Attendance.objects.all().order_by('-date')
-    return render(request, 'attendance_records.html', {'records': records})
+@class_teacher_required('class_id', "You are not authorized to export this class.")
+@replica_reads
+def export_class_attendance(request, class_id):
+    class_instance = request.class_instance
+    return attendance_csv_response([class_instance.pk], f'attendance-class-{class_instance.pk}.csv')
 
-# Allows a student to view their own attendance records grouped by class
+# Exports the attendance of every class the teacher runs as one CSV
 @login_required
-def student_attendance_records(request):
+@replica_reads
+def export_teacher_attendance(request):
+    if request.user.profile.role != 'Teacher':
+        return redirect('home')
+    classes = Class.objects.filter(teacher=request.user).values('pk')
+    return attendance_csv_response(classes, f'attendance-{request.user.username}.csv')
+
+# Allows a student to view their own attendance records grouped by class
+@async_login_required
+@replica_reads
+async def student_attendance_records(request):
     if request.user.profile.role != 'Student':
         return redirect('home')
-    
-    attendance_qs = Attendance.objects.filter(student=request.user).select_related('classid').order_by('-date')
-    records_by_class = {}
-    
-    for record in attendance_qs:
-        class_instance = record.classid
-        if class_instance not in records_by_class:
-            records_by_class[class_instance] = []
-        records_by_class[class_instance].append(record)
-
-    total_records = attendance_qs.count()
-    absences = attendance_qs.filter(status='A').count()
+
+    summaries = [
+        summary async for summary in
+        AttendanceTally.objects.filter(student=request.user)
+        .select_related('classid')
+        .order_by('classid__name')
+    ]
+
+    total_records = sum(summary.total for summary in summaries)
+    absences = sum(rules.lateness_adjusted_absences(summary.absent, summary.late) for summary in summaries)
     absence_pct = (absences / total_records * 100) if total_records > 0 else 0
-    warning = (absence_pct > 25)
+    warning = rules.is_absence_warning(absence_pct)
 
     return render(request, 'attendance_records.html', {
-        'records': records_by_class,
+        'summaries': summaries,
         'absence_percentage': absence_pct,
         'warning': warning,
     })
 
+# Shows one page of a student's attendance records for a single class
+@login_required
+@replica_reads
+def student_class_attendance(request, class_pk):
+    if request.user.profile.role != 'Student':
+        return redirect('home')
 
-# Processes attendance rules for a student
-def process_attendance_rules(attendance, class_instance):
-    student = attendance.student
-    late_count = Attendance.objects.filter(student=student, classid=class_instance, status='L').count()
-    absent_count = Attendance.objects.filter(student=student, classid=class_instance, status='A').count()
-
-    lateness_absences = late_count // 4
-    total_absent = absent_count + lateness_absences
+    class_instance = get_class(request, class_pk)
+    if class_instance.archived_at:
+        records = archived_records(class_instance, student_id=request.user.pk)[::-1]
+    else:
+        records = Attendance.objects.filter(student=request.user, classid=class_instance).order_by('-date', '-id')
+    page = Paginator(records, STUDENT_RECORDS_PER_PAGE).get_page(request.GET.get('page'))
 
-    if late_count == 3:
-        messages.warning(
-            None, f"{student.username} has received a warning for lateness."
-        )
-    elif late_count >= 5:
-        class_instance.students.remove(student)
-        messages.warning(
-            None,
-            f"{student.username} has been removed from {class_instance.name} due to repeated lateness.",
-        )
+    return render(request, 'student_class_attendance.html', {
+        'class_instance': class_instance,
+        'page': page,
+    })
 
-# Generates a range of dates between start_date and end_date
-def generate_date_range(start_date, end_date):
-    return [start_date + timedelta(days=x) for x in range((end_date - start_date).days + 1)]
 
 # Allows a teacher to edit attendance records for a student
 @login_required
+@class_teacher_required('class_pk', "You are not authorized to edit attendance for this class.")
 def edit_attendance(request, class_pk, student_pk):
-    class_instance = get_object_or_404(Class, pk=class_pk)
-    student = get_object_or_404(User, pk=student_pk)
+    class_instance = request.class_instance
+    student = get_object_or_404(class_instance.students, pk=student_pk)
 
     if request.method == 'POST':
-        selected_date = request.POST.get('selected_date')
-        status = request.POST.get('status')
-        reason = request.POST.get('reason', '')
-
-        if selected_date and status:
-            try:
-                Attendance.objects.update_or_create(
-                    classid=class_instance,
-                    student=student,
-                    date=selected_date,
-                    defaults={'status': status, 'reason': reason}
-                )
-            except Exception as e:
-                print(f"Error saving attendance: {e}")
+        if class_instance.archived_at:
+            messages.error(request, ARCHIVED_CLASS_MESSAGE)
+            return redirect('class_detail', pk=class_pk)
+        form = EditAttendanceForm(request.POST)
+        if not form.is_valid():
+            messages.error(request, "Choose a date and a valid status.")
+            return redirect('edit_attendance', class_pk=class_pk, student_pk=student_pk)
+        save_attendance(
+            class_instance, student, form.cleaned_data['selected_date'],
+            form.cleaned_data['status'], form.cleaned_data['reason'],
+        )
+        messages.success(request, "Attendance updated.")
         return redirect('class_detail', pk=class_pk)
 
-    today = date.today()
-    start_date = class_instance.start_date
-    end_date = min(class_instance.end_date, today)
-    all_dates = generate_date_range(start_date, end_date)
-
-    attendance_qs = Attendance.objects.filter(classid=class_instance, student=student).order_by('date')
-    marked_dates = {record.date for record in attendance_qs}
-    unmarked_dates = [d for d in all_dates if d not in marked_dates]
+    unmarked_dates = [day for _, day in MissingMarks(class_instance, student)[:UNMARKED_DATES_SHOWN]]
 
     context = {
         'class_instance': class_instance,
@@ -453,10 +588,75 @@ def edit_attendance(request, class_pk, student_pk):
     }
     return render(request, 'edit_attendance.html', context)
 
+# Lists every enrolled student's missing attendance marks for the class, newest first
+@login_required
+@class_teacher_required('pk', "You are not authorized to view this class.")
+@replica_reads
+def class_gap_report(request, pk):
+    class_instance = request.class_instance
+    page = Paginator(MissingMarks(class_instance), GAP_REPORT_PER_PAGE).get_page(request.GET.get('page'))
+    return render(request, 'gap_report.html', {
+        'class': class_instance,
+        'page': page,
+    })
+
+# Shows the whole class as a students x dates grid of attendance marks
+@login_required
+@class_teacher_required('pk', "You are not authorized to view this class.")
+@replica_reads
+def class_matrix(request, pk):
+    class_instance = request.class_instance
+    # Read once: the fragment cache key and the matrix behind it must agree on the version
+    version = class_version(class_instance.pk)
+    return render(request, 'class_matrix.html', {
+        'class': class_instance,
+        'table': lazy_matrix_table(class_instance, version),
+        'version': version,
+    })
+
+# Shows per-student rates, recent trends and at-risk students for a class, optionally within a date window
+@login_required
+@class_teacher_required('pk', "You are not authorized to view this class.")
+@replica_reads
+def class_analytics(request, pk):
+    class_instance = request.class_instance
+    filter_form = AttendanceFilterForm(request.GET)
+    since = until = None
+    if filter_form.is_valid():
+        since = filter_form.cleaned_data['date_from']
+        until = filter_form.cleaned_data['date_to']
+
+    report = student_report([class_instance.pk], since, until)
+    return render(request, 'class_analytics.html', {
+        'class': class_instance,
+        'filter_form': filter_form,
+        'report': report,
+        'at_risk': [row for row in report if row['at_risk']],
+        'trend': rollup_trend([class_instance.pk], since, until),
+        'trend_window': rules.TREND_WINDOW,
+        'rolled_up_until': rolled_up_until(),
+    })
+
+# Summarizes every class the teacher runs term by term, read from the nightly rollups
+@login_required
+@replica_reads
+def term_report(request):
+    if request.user.profile.role != 'Teacher':
+        return redirect('home')
+    classes = Class.objects.filter(teacher=request.user).values('pk')
+    return render(request, 'term_report.html', {
+        'summaries': term_summaries(classes),
+        'rolled_up_until': rolled_up_until(),
+    })
+
 # Displays detailed profile information for a user
 @login_required
+@replica_reads
 def profile_detail(request, user_id, class_pk=None):
-    user_profile = get_object_or_404(Profile, user_id=user_id)
+    if user_id == request.user.id:
+        user_profile = request.user.profile
+    else:
+        user_profile = get_object_or_404(Profile.objects.select_related('user'), user_id=user_id)
 
     class_pk = class_pk or request.GET.get('class_pk')
 
@@ -469,24 +669,24 @@ def profile_detail(request, user_id, class_pk=None):
 
     if is_teacher:
         if class_pk:
-            class_instance = get_object_or_404(Class, pk=class_pk)
-            if class_instance.teacher != request.user:
+            class_instance = get_class(request, class_pk)
+            if not is_class_teacher(request, class_instance):
                 messages.error(request, "You are not authorized to view this class.")
                 return redirect("home")
 
-            attendance_records = Attendance.objects.filter(
-                student=user_profile.user, classid=class_instance
-            ).order_by("-date")
-
-            total_classes = attendance_records.count()
-            total_absences = attendance_records.filter(status="A").count()
-            total_late_count = attendance_records.filter(status="L").count()
-            lateness_absences = total_late_count // 4
-            absence_percentage = (
-                ((total_absences + lateness_absences) / total_classes) * 100
-                if total_classes > 0
-                else 0
-            )
+            if class_instance.archived_at:
+                attendance_records = archived_records(class_instance, student_id=user_profile.user_id)[::-1]
+            else:
+                attendance_records = Attendance.objects.filter(
+                    student=user_profile.user, classid=class_instance
+                ).order_by("-date")
+
+            tally = AttendanceTally.objects.filter(student=user_profile.user, classid=class_instance).first()
+            if tally:
+                total_classes = tally.total
+                total_absences = tally.absent
+                total_late_count = tally.late
+            absence_percentage = rules.absence_percentage(total_absences, total_late_count, total_classes)
         else:
             messages.warning(request, "Class information is missing. Showing general profile.")
     elif not is_own_profile:
@@ -504,19 +704,38 @@ def profile_detail(request, user_id, class_pk=None):
         "class_instance": class_instance,
     })
 
+# Searches classes by name, marking the ones the student has joined or asked to join
 @login_required
+@replica_reads
 def search_classes(request):
-    query = request.POST.get('query', '') if request.method == 'POST' else ''
+    query = request.POST.get('query', '') if request.method == 'POST' else request.GET.get('query', '')
+    query = query.strip()
 
-    found_classes = Class.objects.filter(name__icontains=query) if query else Class.objects.all()
+    page = class_search_page(query, request.GET.get('page'))
 
-    joined_classes = request.user.enrolled_classes.all()
-
-    pending_requests = JoinRequest.objects.filter(student=request.user, status='Pending').values_list('classid', flat=True)
+    joined_classes = set(member_class_ids(request.user, 'enrolled_classes'))
+    pending_requests = set(pending_class_ids(request.user))
 
     return render(request, 'search_classes.html', {
-        'classes': found_classes,
+        'classes': page.object_list,
+        'page': page,
         'query': query,
         'joined_classes': joined_classes,
         'pending_requests': pending_requests,
     })
+
+# Returns JSON suggestions for the class and student search boxes
+@login_required
+@replica_reads
+def search_typeahead(request):
+    kind = request.GET.get('kind', 'classes')
+    if kind not in ('classes', 'students'):
+        return JsonResponse({'error': 'Unknown search kind.'}, status=400)
+    if kind == 'students' and request.user.profile.role != 'Teacher':
+        return JsonResponse({'error': 'Only teachers can search students.'}, status=403)
+
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    return JsonResponse(typeahead(kind, request.GET.get('q', ''), page))